@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+benchmark.py
+Times SVGGuitarChord.effect() and each add_*_to_svg_tree stage on a blank document.
+
+    python3 benchmark.py --repeat 50 --save-baseline benchmark_baseline.json
+    python3 benchmark.py --baseline benchmark_baseline.json --threshold 0.25
+
+Every case is a representative chord (open, barre, capo, high first fret,
+tuning and comments) plus a chord sheet of all of them from a chords file.
+Wall time, peak memory (tracemalloc), element count and output bytes are
+recorded per case. With --baseline the run fails (exit status 1) when a case
+is slower or bigger than the stored one by more than the threshold.
+Runs offline, Inkscape is not needed.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from chord_render import ChordGeometry, chord_spec_to_options
+from svgGuitarChord import SVGGuitarChord
+
+BLANK_SVG = b'''<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"
+     xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+     xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"
+     width="210mm" height="297mm" viewBox="0 0 210 297" version="1.1" id="svg1">
+  <sodipodi:namedview id="namedview1" inkscape:current-layer="layer1"/>
+  <defs id="defs1"/>
+  <g inkscape:label="Layer 1" inkscape:groupmode="layer" id="layer1"/>
+</svg>
+'''
+
+BENCHMARK_CHORDS = {
+    'open': {'header': 'C', 'frets': 'x32010', 'fingers': 'x32010'},
+    'barre': {'header': 'F', 'frets': '133211', 'fingers': '134211'},
+    'capo': {'header': 'G', 'frets': '320003', 'fingers': '21xxx3', 'capoPos': '2'},
+    'high_first_fret': {'header': 'Bm7b5', 'frets': 'x1212x', 'fingers': 'x1324x', 'firstFret': 14,
+                        'nFrets': 5},
+    'tuning_comments': {'header': 'D', 'frets': 'x00232', 'fingers': 'xxx132', 'tuning': 'D-A-D-G-B-E',
+                        'tuningTrue': True, 'perStringCommentsTrue': True,
+                        'perStringComments': 'R-5-R-5-R-3'},
+}
+SHEET_CASE = 'sheet'
+SHEET_COPIES = 8
+CHECKED_METRICS = ('effect_ms', 'peak_kib', 'elements', 'bytes')
+SIZE_METRICS = ('elements', 'bytes')
+# Differences below this are timer noise, whatever the threshold
+MIN_TIME_DELTA_MS = 0.5
+
+
+def spec_to_args(spec):
+    return [f'--{name}={value}' for name, value in chord_spec_to_options(spec).items()]
+
+
+def stage_method_names():
+    return {stage: f'add_{stage}_to_svg_tree' for stage in ChordGeometry.STAGES}
+
+
+def time_stages(effect, stage_times):
+    """Replaces the add_*_to_svg_tree methods of effect by ones adding their time to stage_times"""
+    for stage, method_name in stage_method_names().items():
+        def timed(method=getattr(effect, method_name), stage=stage):
+            start = time.perf_counter()
+            method()
+            stage_times[stage] = stage_times.get(stage, 0.0) + time.perf_counter() - start
+        setattr(effect, method_name, timed)
+
+
+def run_effect(args, stage_times=None, document=BLANK_SVG):
+    """Runs the extension on document, returns (seconds spent in effect(), output document)"""
+    effect = SVGGuitarChord()
+    effect.parse_arguments(args)
+    effect.options.input_file = io.BytesIO(document)
+    if stage_times is not None:
+        time_stages(effect, stage_times)
+    effect.load_raw()
+    start = time.perf_counter()
+    effect.effect()
+    seconds = time.perf_counter() - start
+    output = io.BytesIO()
+    effect.save(output)
+    effect.clean_up()
+    return seconds, output.getvalue()
+
+
+def peak_memory(args):
+    tracemalloc.start()
+    try:
+        run_effect(args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def count_elements(document):
+    from lxml import etree
+    return sum(1 for _ in etree.fromstring(document).iter())
+
+
+def benchmark_case(args, repeat):
+    run_effect(args)  # warm up imports and caches
+    times = []
+    stages = {stage: [] for stage in ChordGeometry.STAGES}
+    for _ in range(max(repeat, 1)):
+        stage_times = {}
+        seconds, document = run_effect(args, stage_times)
+        times.append(seconds)
+        for stage in stages:
+            stages[stage].append(stage_times.get(stage, 0.0))
+    return {
+        'effect_ms': round(statistics.median(times) * 1000, 4),
+        'effect_min_ms': round(min(times) * 1000, 4),
+        'peak_kib': round(peak_memory(args) / 1024, 1),
+        'elements': count_elements(document),
+        'bytes': len(document),
+        'stages_ms': {stage: round(statistics.median(values) * 1000, 4) for stage, values in stages.items()},
+    }
+
+
+def benchmark_cases(extra_args=()):
+    """name -> extension arguments; the sheet case needs a chords file, the caller removes it"""
+    cases = {name: spec_to_args(spec) + list(extra_args) for name, spec in BENCHMARK_CHORDS.items()}
+    fd, chords_file = tempfile.mkstemp(suffix='.json', prefix='sgc-benchmark-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(list(BENCHMARK_CHORDS.values()) * SHEET_COPIES, f)
+    cases[SHEET_CASE] = [f'--chordsFile={chords_file}', '--columns=5'] + list(extra_args)
+    return cases, chords_file
+
+
+def run_benchmarks(repeat=20, names=None, extra_args=()):
+    cases, chords_file = benchmark_cases(extra_args)
+    try:
+        return {name: benchmark_case(args, repeat) for name, args in cases.items() if not names or name in names}
+    finally:
+        os.unlink(chords_file)
+
+
+def compare(results, baseline, threshold, size_threshold):
+    """Messages for every checked metric that got worse than the baseline by more than the threshold"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in CHECKED_METRICS:
+            old, new = baseline[name].get(metric), result[metric]
+            if old is None:
+                continue
+            allowed = old * (1 + (size_threshold if metric in SIZE_METRICS else threshold))
+            if metric == 'effect_ms':
+                allowed = max(allowed, old + MIN_TIME_DELTA_MS)
+            if new > allowed:
+                regressions.append(f'{name}: {metric} {old} -> {new} (+{100 * (new - old) / old:.0f}%)')
+    return regressions
+
+
+def print_results(results):
+    print(f'{"case":<18}{"effect ms":>11}{"min ms":>10}{"peak KiB":>10}{"elements":>10}{"bytes":>9}')
+    for name, result in results.items():
+        print(f'{name:<18}{result["effect_ms"]:>11.3f}{result["effect_min_ms"]:>10.3f}{result["peak_kib"]:>10.1f}'
+              f'{result["elements"]:>10}{result["bytes"]:>9}')
+    print('\n' + f'{"stage ms (median)":<28}' + ''.join(f'{name[:9]:>10}' for name in results))
+    for stage in ChordGeometry.STAGES:
+        print(f'  {stage:<26}' + ''.join(f'{result["stages_ms"][stage]:>10.3f}' for result in results.values()))
+
+
+def create_parser(args):
+    parser = argparse.ArgumentParser(description='Benchmark svgGuitarChord on a blank document.')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per case, the median is kept')
+    parser.add_argument('--case', action='append', dest='cases', choices=[*BENCHMARK_CHORDS, SHEET_CASE],
+                        help='run only this case, can be repeated')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--save-baseline', help='write the results as JSON to this file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative increase of time and memory, default 0.25')
+    parser.add_argument('--size-threshold', type=float, default=0.0,
+                        help='allowed relative increase of elements and bytes, default 0')
+    parser.add_argument('extension_args', nargs='*', help='extra SVGGuitarChord options, after --')
+    return parser.parse_args(args)
+
+
+def main(args):
+    name_space = create_parser(args)
+    results = run_benchmarks(name_space.repeat, name_space.cases, name_space.extension_args)
+    print_results(results)
+    if name_space.save_baseline:
+        with open(name_space.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+    if name_space.baseline:
+        with open(name_space.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, name_space.threshold, name_space.size_threshold)
+        if regressions:
+            print('\nRegressions against ' + name_space.baseline + ':\n  ' + '\n  '.join(regressions))
+            return 1
+        print('\nNo regressions against ' + name_space.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
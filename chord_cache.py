@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+chord_cache.py
+On-disk cache of rendered chord diagram fragments for svgGuitarChord.
+
+Fragments are stored under the hash of every option that changes the drawing,
+so the same voicing is rendered once and reused across runs and documents.
+The key also holds a hash of chord_render.py: fragments drawn by another
+version of the renderer are not found and age out of the cache.
+The least recently used fragments are removed when the cache grows over its size.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+
+import chord_render
+from chord_render import options_to_spec
+
+# Layout of the key and the fragments, the drawing itself is covered by render_version()
+CACHE_VERSION = 2
+FRAGMENT_SUFFIX = '.svg'
+
+
+@functools.lru_cache(maxsize=1)
+def render_version():
+    """Hash of the source of chord_render, which draws every fragment"""
+    with open(chord_render.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def chord_key(options):
+    """Hash of the options that change a diagram: frets, fingers, nFrets, firstFret, capo, labels, output mode"""
+    spec = options_to_spec(options)
+    spec['version'] = CACHE_VERSION
+    spec['renderer'] = render_version()
+    canonical = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ChordCache:
+    """Fragments in directory/<2 hex chars>/<key>.svg, least recently used evicted over max_bytes"""
+
+    def __init__(self, directory, max_bytes=64 * 2 ** 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + FRAGMENT_SUFFIX)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                fragment = f.read()
+        except OSError:
+            return None
+        try:
+            # mtime is the last use, eviction removes the oldest
+            os.utime(path)
+        except OSError:
+            pass
+        return fragment
+
+    def put(self, key, fragment: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written next to the target and renamed, so readers never see half a fragment
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(fragment)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        if self._size is not None:
+            self._size += len(fragment) - replaced
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """(mtime, size, path) of every cached fragment"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(FRAGMENT_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self.entries())
+        return self._size
+
+    def evict(self):
+        """Removes least recently used fragments until the cache is at 3/4 of max_bytes"""
+        entries = sorted(self.entries())
+        size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 3 // 4
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            size -= entry_size
+        self._size = size
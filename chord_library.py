@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+chord_library.py
+Indexed chord library file for svgGuitarChord.
+
+    python3 chord_library.py build chords.json voicings.json -o chords.sgcl
+    python3 chord_library.py build --all-voicings 8 -o guitar.sgcl
+    python3 chord_library.py lookup chords.sgcl Am F#m7b5
+
+A library holds voicings as fixed size records (frets and fingers packed as
+small ints) sorted by root, quality and name, a hash table from chord name
+to its voicings and a table of the voicings of every root and quality.
+The reader maps the file into memory and reads only the records it is
+asked for, so opening a library of any size is instant.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from chord_render import (
+    DEFAULT_OPTIONS,
+    INSTRUMENTS,
+    STRING_ORDINALS,
+    chord_spec_to_options,
+    get_instrument,
+    load_chord_specs,
+)
+
+MAGIC = b'SGCL'
+LIBRARY_VERSION = 1
+LIBRARY_SUFFIX = '.sgcl'
+MAX_STRINGS = len(STRING_ORDINALS)
+NO_FINGER = 0
+MUTED = -1
+N_ROOTS = 12
+# magic, version, records, hash slots, metadata length, then the offsets of the tables
+HEADER = struct.Struct('<4sHIIIIIII')
+# hash of the name, first record, number of records
+SLOT = struct.Struct('<III')
+# first record, number of records
+GROUP = struct.Struct('<II')
+# name offset and length, root, quality, instrument, strings, first fret, frets shown, frets, fingers
+RECORD = struct.Struct(f'<IHBBBBBB{MAX_STRINGS}b{MAX_STRINGS}B')
+
+
+def name_hash(name_bytes):
+    """32 bit FNV-1a, the same in every process unlike hash()"""
+    h = 0x811c9dc5
+    for byte in name_bytes:
+        h = ((h ^ byte) * 0x01000193) & 0xffffffff
+    return h
+
+
+def library_qualities():
+    from chord_voicings import QUALITIES
+    return list(QUALITIES)
+
+
+def chord_root_quality(name, qualities):
+    """Pitch class of the root and index of the quality, unknown ones after the known ones"""
+    from chord_voicings import parse_chord
+    try:
+        root, quality, _ = parse_chord(name)
+    except ValueError:
+        return N_ROOTS, len(qualities)
+    return root, qualities.index(quality)
+
+
+def spec_to_record(spec):
+    """Chord spec -> (name, instrument, frets, fingers, first fret, frets shown), strings lowest first"""
+    if not spec.get('header'):
+        raise ValueError(f'A library chord needs a header: {spec}')
+    options = {**DEFAULT_OPTIONS, **chord_spec_to_options(spec)}
+    instrument = get_instrument(options['instrument'])
+    ordinals = list(reversed(STRING_ORDINALS[:instrument.strings]))
+    frets = [MUTED if options[f'{o}StringFret'] in 'xX' else int(options[f'{o}StringFret']) for o in ordinals]
+    fingers = [int(f) if f.isdigit() else NO_FINGER for f in (options[f'{o}StringFinger'] for o in ordinals)]
+    return options['header'], instrument.name, frets, fingers, options['firstFret'], options['nFrets']
+
+
+def write_library(specs, file_name):
+    """Writes chord specs (see chord_spec_to_options) as a library, the header is the chord name"""
+    qualities = library_qualities()
+    instruments = list(INSTRUMENTS)
+    rows = []
+    for order, spec in enumerate(specs):
+        name, instrument, frets, fingers, first_fret, n_frets = spec_to_record(spec)
+        root, quality = chord_root_quality(name, qualities)
+        rows.append((root, quality, name, order, instrument, frets, fingers, first_fret, n_frets))
+    rows.sort(key=lambda row: row[:4])
+
+    pool = bytearray()
+    name_offsets = {}
+    records = bytearray()
+    runs = {}
+    groups = {}
+    for index, (root, quality, name, _, instrument, frets, fingers, first_fret, n_frets) in enumerate(rows):
+        encoded = name.encode('utf-8')
+        if encoded not in name_offsets:
+            name_offsets[encoded] = len(pool)
+            pool += encoded
+        padding = [0] * (MAX_STRINGS - len(frets))
+        records += RECORD.pack(name_offsets[encoded], len(encoded), root, quality, instruments.index(instrument),
+                               len(frets), first_fret, n_frets, *frets, *padding, *fingers, *padding)
+        start, count = runs.get(encoded, (index, 0))
+        runs[encoded] = start, count + 1
+        start, count = groups.get((root, quality), (index, 0))
+        groups[(root, quality)] = start, count + 1
+
+    n_slots = 8
+    while n_slots < 2 * len(runs):
+        n_slots *= 2
+    slots = [(0, 0, 0)] * n_slots
+    for encoded, (start, count) in runs.items():
+        h = name_hash(encoded)
+        i = h & (n_slots - 1)
+        while slots[i][2]:
+            i = (i + 1) & (n_slots - 1)
+        slots[i] = h, start, count
+
+    group_table = b''.join(GROUP.pack(*groups.get((root, quality), (0, 0)))
+                           for root in range(N_ROOTS + 1) for quality in range(len(qualities) + 1))
+    meta = json.dumps({'qualities': qualities, 'instruments': instruments}).encode('utf-8')
+    groups_offset = HEADER.size + len(meta)
+    slots_offset = groups_offset + len(group_table)
+    records_offset = slots_offset + n_slots * SLOT.size
+    pool_offset = records_offset + len(records)
+    header = HEADER.pack(MAGIC, LIBRARY_VERSION, len(rows), n_slots, len(meta),
+                         groups_offset, slots_offset, records_offset, pool_offset)
+
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(meta)
+            f.write(group_table)
+            f.write(b''.join(SLOT.pack(*slot) for slot in slots))
+            f.write(records)
+            f.write(pool)
+        os.replace(tmp_path, file_name)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(rows)
+
+
+class ChordLibrary:
+    """Memory mapped reader of a library file, voicings are returned as chord specs"""
+
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.n_records, self.n_slots, meta_length, self._groups_offset,
+             self._slots_offset, self._records_offset, self._pool_offset) = HEADER.unpack_from(self._map)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != LIBRARY_VERSION:
+            self.close()
+            raise ValueError(f'{file_name} is not a chord library')
+        meta = json.loads(self._map[HEADER.size:HEADER.size + meta_length])
+        self.qualities = meta['qualities']
+        self.instruments = meta['instruments']
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.n_records
+
+    def _name(self, offset, length):
+        start = self._pool_offset + offset
+        return self._map[start:start + length]
+
+    def record(self, index):
+        """The voicing at index as a chord spec"""
+        (name_offset, name_length, _, _, instrument, n_strings, first_fret, n_frets,
+         *values) = RECORD.unpack_from(self._map, self._records_offset + index * RECORD.size)
+        frets, fingers = values[:n_strings], values[MAX_STRINGS:MAX_STRINGS + n_strings]
+        return {
+            'header': self._name(name_offset, name_length).decode('utf-8'),
+            'instrument': self.instruments[instrument],
+            'frets': '-'.join('x' if f == MUTED else str(f) for f in frets),
+            'fingers': '-'.join('x' if f == NO_FINGER else str(f) for f in fingers),
+            'firstFret': first_fret,
+            'nFrets': n_frets,
+        }
+
+    def records(self, start, count):
+        return [self.record(index) for index in range(start, start + count)]
+
+    def _find(self, name):
+        """(first record, count) of the chord name, (0, 0) when it is not in the library"""
+        encoded = name.encode('utf-8')
+        h = name_hash(encoded)
+        mask = self.n_slots - 1
+        i = h & mask
+        while True:
+            slot_hash, start, count = SLOT.unpack_from(self._map, self._slots_offset + i * SLOT.size)
+            if not count:
+                return 0, 0
+            if slot_hash == h:
+                name_offset, name_length = RECORD.unpack_from(
+                    self._map, self._records_offset + start * RECORD.size)[:2]
+                if self._name(name_offset, name_length) == encoded:
+                    return start, count
+            i = (i + 1) & mask
+
+    def _instrument(self, index):
+        return self.instruments[RECORD.unpack_from(self._map, self._records_offset + index * RECORD.size)[4]]
+
+    def _indexes(self, name, instrument):
+        start, count = self._find(name)
+        return [index for index in range(start, start + count)
+                if instrument is None or self._instrument(index) == instrument]
+
+    def lookup(self, name, instrument=None):
+        """Every voicing of the chord name, for one instrument when given, [] when it is not in the library"""
+        if instrument is None:
+            return self.records(*self._find(name))
+        return [self.record(index) for index in self._indexes(name, instrument)]
+
+    def get(self, name, default=None, instrument=None):
+        """First voicing of the chord name, for one instrument when given, like dict.get"""
+        indexes = self._indexes(name, instrument)
+        return self.record(indexes[0]) if indexes else default
+
+    def __contains__(self, name):
+        return self._find(name)[1] > 0
+
+    def by_root_quality(self, root, quality=''):
+        """Every voicing with this root (pitch class or note name) and quality ('m7', '' for major)"""
+        if isinstance(root, str):
+            from chord_voicings import note_to_pitch_class
+            root = note_to_pitch_class(root)
+        if quality not in self.qualities:
+            return []
+        group = root * (len(self.qualities) + 1) + self.qualities.index(quality)
+        return self.records(*GROUP.unpack_from(self._map, self._groups_offset + group * GROUP.size))
+
+
+def all_voicing_specs(limit, instrument):
+    from chord_voicings import NOTE_NAMES, QUALITIES, chord_voicing_specs
+    for root in NOTE_NAMES:
+        for quality in QUALITIES:
+            yield from chord_voicing_specs(root + quality, limit=limit, instrument=instrument)
+
+
+def create_parser(args):
+    parser = argparse.ArgumentParser(description='Build or read an indexed chord library.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='write chords files as a library')
+    build.add_argument('chords_files', nargs='*', help='JSON or CSV chords files, the header is the chord name')
+    build.add_argument('--all-voicings', type=int, default=0, metavar='LIMIT',
+                       help='add up to LIMIT voicings of every root and quality found by chord_voicings.py')
+    build.add_argument('--instrument', default='guitar', help='instrument of --all-voicings')
+    build.add_argument('-o', '--output', required=True)
+    lookup = commands.add_parser('lookup', help='print the voicings of chords as a chords file')
+    lookup.add_argument('library')
+    lookup.add_argument('chords', nargs='+')
+    lookup.add_argument('--instrument', help='only the voicings of this instrument')
+    return parser.parse_args(args)
+
+
+def main(args):
+    name_space = create_parser(args)
+    if name_space.command == 'build':
+        specs = []
+        for chords_file in name_space.chords_files:
+            specs.extend(load_chord_specs(chords_file))
+        if name_space.all_voicings:
+            specs.extend(all_voicing_specs(name_space.all_voicings, name_space.instrument))
+        count = write_library(specs, name_space.output)
+        print(f'{count} voicings written to {name_space.output}')
+        return
+    with ChordLibrary(name_space.library) as library:
+        specs = [spec for chord in name_space.chords for spec in library.lookup(chord, name_space.instrument)]
+    print(json.dumps(specs, indent=1))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
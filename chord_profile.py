@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+chord_profile.py
+Timings of an svgGuitarChord run, for the --profile option.
+
+Records the wall time of the run phases (inkex import, document loading,
+effect, saving), of each diagram stage summed over all chords, and the
+number of elements every stage added to the document. A stage run inside
+another one (the drawing stages of a chord missing from the cache) is not
+counted in the outer stage.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import contextlib
+import json
+import time
+
+PHASES = ('import_inkex', 'load', 'effect', 'save')
+NOT_PROFILED = contextlib.nullcontext()
+
+
+class RunProfile:
+    """Seconds per phase and per stage, elements per stage; a disabled profile records nothing"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = {}
+        self.stages = {}
+        self.elements = {}
+        self.chords = 0
+        self.current_stage = None
+        # Seconds of the stages run inside the current one
+        self.nested_seconds = 0.0
+
+    def add_time(self, times, name, seconds):
+        times[name] = times.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def _timed(self, times, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(times, name, time.perf_counter() - start)
+
+    def phase(self, name):
+        return self._timed(self.phases, name) if self.enabled else NOT_PROFILED
+
+    @contextlib.contextmanager
+    def _stage(self, name):
+        """Times a stage without the stages run inside it, so that stage times add up"""
+        outer, self.current_stage = self.current_stage, name
+        outer_nested, self.nested_seconds = self.nested_seconds, 0.0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.add_time(self.stages, name, seconds - self.nested_seconds)
+            self.current_stage, self.nested_seconds = outer, outer_nested + seconds
+
+    def stage(self, name):
+        return self._stage(name) if self.enabled else NOT_PROFILED
+
+    def count_elements(self, count):
+        """Adds count elements to the stage running now"""
+        if self.enabled and self.current_stage is not None:
+            self.elements[self.current_stage] = self.elements.get(self.current_stage, 0) + count
+
+    def to_dict(self):
+        def ms(times):
+            return {name: round(seconds * 1000, 3) for name, seconds in times.items()}
+
+        return {
+            'total_ms': round(sum(self.phases.values()) * 1000, 3),
+            'phases_ms': ms({name: self.phases[name] for name in PHASES if name in self.phases}),
+            'chords': self.chords,
+            'stages_ms': ms(self.stages),
+            'elements': dict(self.elements),
+            'total_elements': sum(self.elements.values()),
+        }
+
+    def summary(self):
+        report = self.to_dict()
+        lines = [f'Total {report["total_ms"]:.1f} ms, {report["chords"]} chords, '
+                 f'{report["total_elements"]} elements']
+        lines.append('  ' + ', '.join(f'{name} {ms:.1f} ms' for name, ms in report['phases_ms'].items()))
+        for name, ms in sorted(report['stages_ms'].items(), key=lambda item: -item[1]):
+            lines.append(f'  {name:<26}{ms:>9.2f} ms{report["elements"].get(name, 0):>7} elements')
+        return '\n'.join(lines)
+
+    def write_json(self, file_name):
+        with open(file_name, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=1)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+chord_raster.py
+PNG thumbnails of chord diagrams with numpy, without Inkscape or cairo.
+
+    python3 render_chords.py chords.json -o png/ --png --scale 2
+
+Only the few shapes of a diagram are drawn: straight and arc path segments
+stroked with round caps (grid, nut, capo, barre, X and O), filled paths
+(dots) and text labels in a built-in 5x7 bitmap font. Strokes are
+anti-aliased by their distance to the pixel centre, fills and text are
+supersampled. PNG files are encoded with zlib from the standard library.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import math
+import struct
+import zlib
+
+import numpy as np
+
+from chord_render import PATH_TAG, PATH_TOKEN_RE, TEXT_TAG, ChordDiagram, document_size
+
+# Rows of '#' (ink) and '.', 7 rows from cap height to baseline and 2 more for descenders
+FONT = {
+    ' ': '..... ..... ..... ..... ..... ..... .....',
+    '0': '.###. #...# #..## #.#.# ##..# #...# .###.',
+    '1': '..#.. .##.. ..#.. ..#.. ..#.. ..#.. .###.',
+    '2': '.###. #...# ....# ...#. ..#.. .#... #####',
+    '3': '##### ...#. ..#.. ...#. ....# #...# .###.',
+    '4': '...#. ..##. .#.#. #..#. ##### ...#. ...#.',
+    '5': '##### #.... ####. ....# ....# #...# .###.',
+    '6': '..##. .#... #.... ####. #...# #...# .###.',
+    '7': '##### ....# ...#. ..#.. .#... .#... .#...',
+    '8': '.###. #...# #...# .###. #...# #...# .###.',
+    '9': '.###. #...# #...# .#### ....# ...#. .##..',
+    'A': '.###. #...# #...# ##### #...# #...# #...#',
+    'B': '####. #...# #...# ####. #...# #...# ####.',
+    'C': '.###. #...# #.... #.... #.... #...# .###.',
+    'D': '###.. #..#. #...# #...# #...# #..#. ###..',
+    'E': '##### #.... #.... ####. #.... #.... #####',
+    'F': '##### #.... #.... ####. #.... #.... #....',
+    'G': '.###. #...# #.... #.### #...# #...# .####',
+    'H': '#...# #...# #...# ##### #...# #...# #...#',
+    'I': '.###. ..#.. ..#.. ..#.. ..#.. ..#.. .###.',
+    'J': '..### ...#. ...#. ...#. ...#. #..#. .##..',
+    'K': '#...# #..#. #.#.. ##... #.#.. #..#. #...#',
+    'L': '#.... #.... #.... #.... #.... #.... #####',
+    'M': '#...# ##.## #.#.# #.#.# #...# #...# #...#',
+    'N': '#...# #...# ##..# #.#.# #..## #...# #...#',
+    'O': '.###. #...# #...# #...# #...# #...# .###.',
+    'P': '####. #...# #...# ####. #.... #.... #....',
+    'Q': '.###. #...# #...# #...# #.#.# #..#. .##.#',
+    'R': '####. #...# #...# ####. #.#.. #..#. #...#',
+    'S': '.#### #.... #.... .###. ....# ....# ####.',
+    'T': '##### ..#.. ..#.. ..#.. ..#.. ..#.. ..#..',
+    'U': '#...# #...# #...# #...# #...# #...# .###.',
+    'V': '#...# #...# #...# #...# #...# .#.#. ..#..',
+    'W': '#...# #...# #...# #.#.# #.#.# #.#.# .#.#.',
+    'X': '#...# #...# .#.#. ..#.. .#.#. #...# #...#',
+    'Y': '#...# #...# .#.#. ..#.. ..#.. ..#.. ..#..',
+    'Z': '##### ....# ...#. ..#.. .#... #.... #####',
+    'a': '..... ..... .###. ....# .#### #...# .####',
+    'b': '#.... #.... #.##. ##..# #...# #...# ####.',
+    'c': '..... ..... .###. #.... #.... #...# .###.',
+    'd': '....# ....# .##.# #..## #...# #...# .####',
+    'e': '..... ..... .###. #...# ##### #.... .###.',
+    'f': '..##. .#..# .#... ###.. .#... .#... .#...',
+    'g': '..... ..... .#### #...# #...# #...# .#### ....# .###.',
+    'h': '#.... #.... #.##. ##..# #...# #...# #...#',
+    'i': '..#.. ..... .##.. ..#.. ..#.. ..#.. .###.',
+    'j': '...#. ..... ..##. ...#. ...#. ...#. ...#. #..#. .##..',
+    'k': '#.... #.... #..#. #.#.. ##... #.#.. #..#.',
+    'l': '.##.. ..#.. ..#.. ..#.. ..#.. ..#.. .###.',
+    'm': '..... ..... ##.#. #.#.# #.#.# #.#.# #.#.#',
+    'n': '..... ..... #.##. ##..# #...# #...# #...#',
+    'o': '..... ..... .###. #...# #...# #...# .###.',
+    'p': '..... ..... ####. #...# #...# #...# ####. #.... #....',
+    'q': '..... ..... .#### #...# #...# #...# .#### ....# ....#',
+    'r': '..... ..... #.##. ##..# #.... #.... #....',
+    's': '..... ..... .###. #.... .###. ....# ####.',
+    't': '.#... .#... ###.. .#... .#... .#..# ..##.',
+    'u': '..... ..... #...# #...# #...# #..## .##.#',
+    'v': '..... ..... #...# #...# #...# .#.#. ..#..',
+    'w': '..... ..... #...# #...# #.#.# #.#.# .#.#.',
+    'x': '..... ..... #...# .#.#. ..#.. .#.#. #...#',
+    'y': '..... ..... #...# #...# #...# #...# .#### ....# .###.',
+    'z': '..... ..... ##### ...#. ..#.. .#... #####',
+    '#': '.#.#. .#.#. ##### .#.#. ##### .#.#. .#.#.',
+    '+': '..... ..#.. ..#.. ##### ..#.. ..#.. .....',
+    '-': '..... ..... ..... ##### ..... ..... .....',
+    '/': '....# ....# ...#. ..#.. .#... #.... #....',
+    '(': '...#. ..#.. .#... .#... .#... ..#.. ...#.',
+    ')': '.#... ..#.. ...#. ...#. ...#. ..#.. .#...',
+    '.': '..... ..... ..... ..... ..... .##.. .##..',
+    ',': '..... ..... ..... ..... .##.. ..#.. .#...',
+    '*': '..... ..#.. #.#.# .###. #.#.# ..#.. .....',
+    '°': '.##.. #..#. #..#. .##.. ..... ..... .....',
+    'ø': '..... ....# .###. #.#.# #.#.# .###. #....',
+    'Δ': '..... ..#.. .#.#. #...# #...# #...# #####',
+    '?': '.###. #...# ....# ...#. ..#.. ..... ..#..',
+}
+FONT_ALIASES = {'♯': '#', '♭': 'b'}
+GLYPH_WIDTH = 5
+GLYPH_ROWS = 9
+# Cap height of the font as a fraction of font-size, one column of space between glyphs
+CAP_HEIGHT = 0.7
+GLYPHS = {char: np.array([[c == '#' for c in row] for row in (rows.split() + ['.....'] * 2)[:GLYPH_ROWS]])
+          for char, rows in FONT.items()}
+ARC_STEPS = 24
+
+
+def parse_style(style):
+    return dict(item.split(':', 1) for item in style.split(';') if ':' in item)
+
+
+def parse_color(value):
+    if not value or value == 'none':
+        return None
+    value = value.lstrip('#')
+    if len(value) == 3:
+        value = ''.join(c * 2 for c in value)
+    return tuple(int(value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def arc_points(x1, y1, r, large_arc, sweep, x2, y2):
+    """Points of a circular SVG arc from (x1, y1) to (x2, y2), the start excluded"""
+    hx, hy = (x1 - x2) / 2, (y1 - y2) / 2
+    if r == 0 or (hx == 0 and hy == 0):
+        return [(x2, y2)]
+    r = max(r, math.hypot(hx, hy))
+    root = math.sqrt(max(0.0, (r * r - hx * hx - hy * hy) / (hx * hx + hy * hy)))
+    if large_arc == sweep:
+        root = -root
+    cx, cy = root * hy + (x1 + x2) / 2, -root * hx + (y1 + y2) / 2
+    start = math.atan2(y1 - cy, x1 - cx)
+    delta = math.atan2(y2 - cy, x2 - cx) - start
+    if sweep and delta < 0:
+        delta += 2 * math.pi
+    elif not sweep and delta > 0:
+        delta -= 2 * math.pi
+    steps = max(2, int(ARC_STEPS * abs(delta) / math.pi))
+    return [(cx + r * math.cos(start + delta * i / steps), cy + r * math.sin(start + delta * i / steps))
+            for i in range(1, steps + 1)]
+
+
+def path_polylines(d):
+    """SVG path data (M L H V A Z, absolute and relative) -> list of point lists"""
+    tokens = PATH_TOKEN_RE.findall(d)
+    polylines, points = [], []
+    x = y = start_x = start_y = 0.0
+    command, i = None, 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in 'Zz':
+                points.append((start_x, start_y))
+                x, y = start_x, start_y
+                continue
+        relative = command.islower()
+        upper = command.upper()
+        n_args = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'A': 7}[upper]
+        args = [float(t) for t in tokens[i:i + n_args]]
+        i += n_args
+        if upper == 'M':
+            if len(points) > 1:
+                polylines.append(points)
+            x, y = (x + args[0], y + args[1]) if relative else args
+            start_x, start_y = x, y
+            points = [(x, y)]
+            # Coordinates after a moveto are linetos
+            command = 'l' if relative else 'L'
+            continue
+        if upper == 'L':
+            x, y = (x + args[0], y + args[1]) if relative else args
+            points.append((x, y))
+        elif upper == 'H':
+            x = x + args[0] if relative else args[0]
+            points.append((x, y))
+        elif upper == 'V':
+            y = y + args[0] if relative else args[0]
+            points.append((x, y))
+        else:
+            rx, _, _, large_arc, sweep, ex, ey = args
+            if relative:
+                ex, ey = x + ex, y + ey
+            points.extend(arc_points(x, y, rx, int(large_arc), int(sweep), ex, ey))
+            x, y = ex, ey
+    if len(points) > 1:
+        polylines.append(points)
+    return polylines
+
+
+class Raster:
+    """Premultiplied RGBA image in floats, shapes are composited over it with their coverage"""
+
+    def __init__(self, width, height, background=(1.0, 1.0, 1.0), supersample=4):
+        self.width, self.height = width, height
+        self.supersample = supersample
+        self.pixels = np.zeros((height, width, 4))
+        self.opaque = background is not None
+        if self.opaque:
+            self.pixels[:] = (*background, 1.0)
+
+    def box(self, x0, y0, x1, y1):
+        """Pixel bounds (clipped to the image) of a box in pixel coordinates"""
+        return (max(int(math.floor(x0)), 0), max(int(math.floor(y0)), 0),
+                min(int(math.ceil(x1)), self.width), min(int(math.ceil(y1)), self.height))
+
+    def composite(self, box, coverage, color):
+        left, top, right, bottom = box
+        alpha = coverage[..., None]
+        region = self.pixels[top:bottom, left:right]
+        region *= 1 - alpha
+        region += alpha * np.array((*color, 1.0))
+
+    def subpixels(self, box):
+        """Centres of the supersampled pixels of box, (rows, columns) arrays"""
+        left, top, right, bottom = box
+        s = self.supersample
+        xs = left + (np.arange((right - left) * s) + 0.5) / s
+        ys = top + (np.arange((bottom - top) * s) + 0.5) / s
+        return np.meshgrid(xs, ys)
+
+    def downsample(self, mask):
+        s = self.supersample
+        height, width = mask.shape[0] // s, mask.shape[1] // s
+        return mask.reshape(height, s, width, s).mean(axis=(1, 3))
+
+    def stroke(self, polylines, width, color):
+        half = width / 2
+        for points in polylines:
+            points = np.array(points)
+            box = self.box(points[:, 0].min() - half - 1, points[:, 1].min() - half - 1,
+                           points[:, 0].max() + half + 1, points[:, 1].max() + half + 1)
+            left, top, right, bottom = box
+            if right <= left or bottom <= top:
+                continue
+            px, py = np.meshgrid(np.arange(left, right) + 0.5, np.arange(top, bottom) + 0.5)
+            px, py = px[..., None], py[..., None]
+            a, b = points[:-1], points[1:]
+            dx, dy = b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]
+            length2 = np.where(dx * dx + dy * dy == 0, 1, dx * dx + dy * dy)
+            t = np.clip(((px - a[:, 0]) * dx + (py - a[:, 1]) * dy) / length2, 0, 1)
+            distance = np.sqrt(((px - a[:, 0] - t * dx) ** 2 + (py - a[:, 1] - t * dy) ** 2).min(axis=-1))
+            # Round caps and joins come with the distance to the segments
+            self.composite(box, np.clip(half + 0.5 - distance, 0, 1), color)
+
+    def fill(self, polylines, color):
+        points = np.concatenate([np.array(p) for p in polylines])
+        box = self.box(*points.min(axis=0), *points.max(axis=0))
+        if box[2] <= box[0] or box[3] <= box[1]:
+            return
+        left, top, right, bottom = box
+        edges = np.concatenate([np.stack([p, np.roll(p, -1, axis=0)], axis=1)
+                                for p in (np.array(polyline) for polyline in polylines)])
+        edges = edges[edges[:, 0, 1] != edges[:, 1, 1]]
+        (x0, y0), (x1, y1) = edges[:, 0].T, edges[:, 1].T
+        # Scanlines: supersampled vertically, exact horizontal coverage between pairs of crossings
+        ys = (top + (np.arange((bottom - top) * self.supersample) + 0.5) / self.supersample)[:, None]
+        crossing = (ys >= np.minimum(y0, y1)) & (ys < np.maximum(y0, y1))
+        xs = np.sort(np.where(crossing, x0 + (ys - y0) * (x1 - x0) / (y1 - y0), np.inf), axis=1)
+        if xs.shape[1] % 2:
+            xs = np.pad(xs, ((0, 0), (0, 1)), constant_values=np.inf)
+        columns = np.arange(left, right)
+        starts, ends = xs[:, 0::2, None], xs[:, 1::2, None]
+        # Even-odd rule: inside between the first and second crossing, the third and fourth...
+        spans = np.clip(ends, columns, columns + 1) - np.clip(starts, columns, columns + 1)
+        coverage = np.nan_to_num(spans).sum(axis=1)
+        coverage = coverage.reshape(bottom - top, self.supersample, right - left).mean(axis=1)
+        self.composite(box, np.clip(coverage, 0, 1), color)
+
+    def text(self, text, x, y, font_size, anchor, color):
+        glyphs = [GLYPHS.get(FONT_ALIASES.get(c, c), GLYPHS['?']) for c in text]
+        if not glyphs:
+            return
+        # One column of space after every glyph, glyph pixels are font_size * CAP_HEIGHT / 7 wide
+        bitmap = np.concatenate([np.pad(g, ((0, 0), (0, 1))) for g in glyphs], axis=1)[:, :-1]
+        unit = font_size * CAP_HEIGHT / 7
+        width = bitmap.shape[1] * unit
+        left = x - {'middle': width / 2, 'end': width}.get(anchor, 0)
+        top = y - 7 * unit
+        box = self.box(left, top, left + width, top + GLYPH_ROWS * unit)
+        if box[2] <= box[0] or box[3] <= box[1]:
+            return
+        px, py = self.subpixels(box)
+        columns = np.floor((px - left) / unit).astype(int)
+        rows = np.floor((py - top) / unit).astype(int)
+        valid = (columns >= 0) & (columns < bitmap.shape[1]) & (rows >= 0) & (rows < GLYPH_ROWS)
+        ink = np.zeros(px.shape, dtype=bool)
+        ink[valid] = bitmap[rows[valid], columns[valid]]
+        self.composite(box, self.downsample(ink), color)
+
+    def to_rgba(self):
+        """uint8 (height, width, 4) straight alpha"""
+        if self.opaque:
+            return np.round(self.pixels * 255).astype(np.uint8)
+        alpha = self.pixels[..., 3:]
+        rgb = np.divide(self.pixels[..., :3], alpha, out=np.zeros_like(self.pixels[..., :3]), where=alpha > 0)
+        return np.round(np.concatenate([rgb, alpha], axis=-1) * 255).astype(np.uint8)
+
+
+def draw_primitive(raster, primitive, scale):
+    style = parse_style(primitive.attrib.get('style', ''))
+    if primitive.tag == PATH_TAG:
+        polylines = [[(x * scale, y * scale) for x, y in points]
+                     for points in path_polylines(primitive.attrib['d'])]
+        if not polylines:
+            return
+        fill = parse_color(style.get('fill', '#000000'))
+        if fill is not None:
+            raster.fill(polylines, fill)
+        stroke = parse_color(style.get('stroke'))
+        if stroke is not None:
+            raster.stroke(polylines, float(style.get('stroke-width', 1)) * scale, stroke)
+    elif primitive.tag == TEXT_TAG and primitive.text:
+        raster.text(primitive.text, float(primitive.attrib['x']) * scale, float(primitive.attrib['y']) * scale,
+                    float(style.get('font-size', 12)) * scale, style.get('text-anchor', 'start'),
+                    parse_color(style.get('fill', '#000000')))
+
+
+def rasterize_chord(spec=None, scale=1.0, background=(1.0, 1.0, 1.0), supersample=4):
+    """Chord spec -> uint8 RGBA array (height, width, 4); background None is transparent"""
+    # Shapes are drawn inline, the rasterizer knows neither <use> nor classes
+    diagram = ChordDiagram({**(spec or {}), 'useSymbols': False, 'useClasses': False})
+    width, height = document_size(diagram)
+    raster = Raster(int(math.ceil(width * scale)), int(math.ceil(height * scale)), background, supersample)
+    for primitive in diagram.chord_primitives():
+        draw_primitive(raster, primitive, scale)
+    return raster.to_rgba()
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def encode_png(rgba, level=6):
+    """uint8 (height, width, 4) array -> PNG file bytes"""
+    height, width, _ = rgba.shape
+    # Filter type 0 (None) in front of every row
+    rows = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+    return (b'\x89PNG\r\n\x1a\n'
+            + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + png_chunk(b'IDAT', zlib.compress(rows.tobytes(), level))
+            + png_chunk(b'IEND', b''))
+
+
+def render_png(spec=None, scale=1.0, transparent=False):
+    """Chord spec -> PNG file bytes, scale is pixels per SVG user unit"""
+    return encode_png(rasterize_chord(spec, scale, None if transparent else (1.0, 1.0, 1.0)))
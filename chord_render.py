@@ -0,0 +1,997 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+chord_render.py
+Chord diagram geometry of svgGuitarChord without the inkex dependency.
+
+render_chord(spec) returns a standalone SVG document, render_chord_element(spec)
+the same diagram as an lxml element. write_chord_book(specs, file_name) streams
+many chords into one document, chord_book_element(specs) builds it as a tree. svgGuitarChord.SVGGuitarChord draws the
+same primitives into the current Inkscape layer.
+
+Copyright (C) 2013 Pablo Fernández <pablo.fbus(a)gmail.com>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import csv
+import functools
+import json
+import re
+import sys
+from collections import namedtuple
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+PATH_TAG = f'{{{SVG_NS}}}path'
+USE_TAG = f'{{{SVG_NS}}}use'
+GROUP_TAG = f'{{{SVG_NS}}}g'
+STYLE_TAG = f'{{{SVG_NS}}}style'
+TEXT_TAG = 'text'
+XLINK_HREF = f'{{{XLINK_NS}}}href'
+
+# Guitar sizes, other instruments are in INSTRUMENTS
+FINGERBOARD_WIDTH = 90
+FRET_WIDTH = 32
+GAP_STRINGS = 18
+# Grid and capo paths kept per method of Instrument, over all instruments and fret counts
+PATHS_CACHE_SIZE = 64
+# Spacing between the diagrams of a chords file, see batch_cell_coordinates
+BATCH_CELL_PADDING = 60
+BATCH_CELL_MARGIN = 80
+# Upper left corner of the grid in the current layer and in a standalone document
+LAYER_ORIGIN = (30, 30)
+DOCUMENT_ORIGIN = (30, 50)
+
+STRING_ORDINALS = ('first', 'second', 'third', 'fourth', 'fifth', 'sixth', 'seventh', 'eighth')
+INT_OPTIONS = ('nFrets', 'firstFret')
+BOOL_OPTIONS = ('headerTrue', 'tuningTrue', 'perStringCommentsTrue', 'leftFingerNumberTrue', 'useSymbols',
+                'useClasses', 'coalescePaths')
+STR_OPTIONS = ('header', 'capoPos', 'tuning', 'perStringComments', 'instrument') \
+    + tuple(f'{ordinal}StringFret' for ordinal in STRING_ORDINALS) \
+    + tuple(f'{ordinal}StringFinger' for ordinal in STRING_ORDINALS)
+
+# Same defaults as the SVGGuitarChord command line options
+DEFAULT_OPTIONS = {
+    'headerTrue': True,
+    'header': 'Em',
+    'nFrets': 4,
+    'firstFret': 1,
+    'capoPos': 'No',
+    'tuningTrue': False,
+    'instrument': 'guitar',
+    # Empty: the tuning of the instrument
+    'tuning': '',
+    'perStringCommentsTrue': False,
+    'perStringComments': 'R-5-R-3-5-R',
+    'leftFingerNumberTrue': True,
+    'useSymbols': False,
+    'useClasses': False,
+    'coalescePaths': False,
+    **{f'{ordinal}StringFret': 'x' for ordinal in STRING_ORDINALS},
+    **{f'{ordinal}StringFinger': 'x' for ordinal in STRING_ORDINALS},
+}
+
+
+
+class Instrument:
+    """String count, spacing and default tuning of a fretted instrument.
+
+    The parts of the grid and capo paths that only depend on the instrument
+    and the number of frets are built once and reused by every diagram; the
+    PATHS_CACHE_SIZE most recently used lengths are kept.
+    """
+    __slots__ = ('name', 'strings', 'gap_strings', 'fret_width', 'tuning', 'width', 'half_width',
+                 'string_offsets')
+
+    def __init__(self, name, strings, tuning, gap_strings=GAP_STRINGS, fret_width=FRET_WIDTH):
+        self.name = name
+        self.strings = strings
+        self.gap_strings = gap_strings
+        self.fret_width = fret_width
+        self.tuning = tuning
+        self.width = (strings - 1) * gap_strings
+        self.half_width = self.width // 2 if self.width % 2 == 0 else self.width / 2
+        # x of each string from the left edge, lowest string first
+        self.string_offsets = tuple(i * gap_strings for i in range(strings))
+
+    @functools.lru_cache(maxsize=PATHS_CACHE_SIZE)
+    def frets_tail(self, length_in_frets):
+        return f'm -{self.width},{self.fret_width} h {self.width}' * length_in_frets
+
+    @functools.lru_cache(maxsize=PATHS_CACHE_SIZE)
+    def strings_tail(self, length_in_frets):
+        string_length = length_in_frets * self.fret_width
+        return f'm {self.gap_strings},-{string_length} v {string_length} ' * (self.strings - 1)
+
+    @functools.lru_cache(maxsize=PATHS_CACHE_SIZE)
+    def capo_tail(self, length_string):
+        return f' m {self.gap_strings},-{length_string} v {length_string}' * (self.strings - 1)
+
+    def string_x(self, left, string_number):
+        """x of a string, string 1 is the highest and drawn on the right"""
+        return left + self.width - (string_number - 1) * self.gap_strings
+
+
+GUITAR = Instrument('guitar', 6, 'E-A-D-G-B-E')
+INSTRUMENTS = {instrument.name: instrument for instrument in (
+    GUITAR,
+    Instrument('guitar7', 7, 'B-E-A-D-G-B-E'),
+    Instrument('guitar8', 8, 'F#-B-E-A-D-G-B-E'),
+    Instrument('ukulele', 4, 'G-C-E-A'),
+    Instrument('baritone_ukulele', 4, 'D-G-B-E'),
+    Instrument('mandolin', 4, 'G-D-A-E'),
+    Instrument('bass', 4, 'E-A-D-G', gap_strings=22, fret_width=36),
+    Instrument('bass5', 5, 'B-E-A-D-G', gap_strings=22, fret_width=36),
+)}
+
+
+def get_instrument(name):
+    try:
+        return INSTRUMENTS[name or GUITAR.name]
+    except KeyError:
+        raise ValueError(f'Unknown instrument "{name}", use one of: {", ".join(INSTRUMENTS)}') from None
+
+
+# One SVG element of a diagram; kind names the create_* helper that made it
+Primitive = namedtuple('Primitive', 'tag attrib text kind')
+
+
+def style_to_str(style):
+    # Same serialization as str(inkex.Style(dict)): keys sorted, ';' separated
+    return ';'.join(f'{key}:{value}' for key, value in sorted(style.items()))
+
+
+LINE_STYLE = {'color': '#000000', 'fill': 'none', 'stroke': '#000000',
+              'stroke-width': '1.6', 'stroke-linecap': 'round'}
+NUT_STYLE = {'color': '#a85632', 'fill': 'none', 'stroke': '#a85632',
+             'stroke-width': '3.2', 'stroke-linecap': 'round'}
+MARKER_STYLE = {'color': '#000000', 'fill': 'none', 'stroke': '#000000',
+                'stroke-width': '1.1', 'stroke-linecap': 'round'}
+# Styles by primitive kind
+STYLES = {
+    'grid': LINE_STYLE,
+    'nut': NUT_STYLE,
+    'capo': NUT_STYLE,
+    'capo_path': LINE_STYLE,
+    'first_fret_label': {'font-size': '12', 'font-family': 'Latin Modern Roman',
+                         'font-weight': 'bold', 'text-anchor': 'end', 'fill': '#434bf0'},
+    'capo_label': {'font-size': '8', 'font-family': 'Latin Modern Roman',
+                   'font-weight': 'bold', 'text-anchor': 'end', 'fill': '#000000'},
+    'header': {'font-size': '18', 'font-family': 'Libertinus Serif',
+               'text-anchor': 'middle', 'fill': '#000000'},
+    'tuning_label': {'font-size': '8', 'font-family': 'Libertinus Serif',
+                     'text-anchor': 'middle', 'fill': '#000000'},
+    'string_comment': {'font-size': '10', 'font-family': 'Libertinus Serif',
+                       'text-anchor': 'middle', 'fill': '#000000'},
+    'mute': MARKER_STYLE,
+    'open': MARKER_STYLE,
+    'dot': {'color': '#000000', 'fill': '#000000'},
+    'finger_label': {'font-size': '8', 'font-family': 'Latin Modern Roman',
+                     'font-weight': 'bold', 'text-anchor': 'start', 'fill': '#000000'},
+    'barre': {'color': '#000000', 'fill': 'none', 'stroke': '#000000',
+              'stroke-width': '2', 'stroke-linecap': 'round'},
+}
+# Serialized once per process and shared by every element
+STYLE_STRINGS = {kind: style_to_str(style) for kind, style in STYLES.items()}
+STYLESHEET_ID = 'sgc-stylesheet'
+
+
+def css_class(kind):
+    return 'sgc-' + kind.replace('_', '-')
+
+
+def stylesheet():
+    """CSS rules for the class= output of useClasses, kinds with the same style share a rule"""
+    selectors = {}
+    for kind, style in STYLE_STRINGS.items():
+        selectors.setdefault(style, []).append(f'.{css_class(kind)}')
+    return ''.join(f'{",".join(kinds)}{{{style}}}' for style, kinds in selectors.items())
+
+
+def stylesheet_primitive():
+    return Primitive(STYLE_TAG, {'id': STYLESHEET_ID, 'type': 'text/css'}, stylesheet(), 'stylesheet')
+
+
+def frets_path(coordinates, lenth_in_frets, instrument=GUITAR):
+    return f'M {str(coordinates[0])} , {str(coordinates[1])} h {instrument.width}' \
+        + instrument.frets_tail(lenth_in_frets)
+
+
+def strings_path(coordinates, length_in_frets, instrument=GUITAR):
+    string_length = length_in_frets * instrument.fret_width
+    return f'M {str(coordinates[0])}, {str(coordinates[1])} v {string_length} ' \
+        + instrument.strings_tail(length_in_frets)
+
+
+def create_grid(length_in_frets, coordinates, instrument=GUITAR):
+    path = f'{frets_path(coordinates, length_in_frets, instrument)} {strings_path(coordinates, length_in_frets, instrument)}'
+    return {
+        'd': path,
+        'style': STYLE_STRINGS['grid'],
+    }
+
+
+def create_nut(coordinates, instrument=GUITAR):
+    path = f'M {str(coordinates[0])}, {str(coordinates[1])} h {instrument.width} '
+    return {'d': path, 'style': STYLE_STRINGS['nut']}
+
+
+def create_header(coordinates):
+    return {'style': STYLE_STRINGS['header'],
+            'x': str(coordinates[0]), 'y': str(coordinates[1])}
+
+
+def create_tuning_labels(coor):
+    tu = []
+    for n in range(len(coor)):
+        tu.append({'style': STYLE_STRINGS['tuning_label'],
+                   'x': str(coor[n][0]), 'y': str(coor[n][1])})
+    return tu
+
+
+def create_per_string_comments(coordinates, length_in_frets, instrument=GUITAR):
+    y_coordinate_comment = length_in_frets * instrument.fret_width + 15
+    comments_coordinates = []
+    for offset in instrument.string_offsets:
+        comments_coordinates.append(
+            {
+                'style': STYLE_STRINGS['string_comment'],
+                'x': str(coordinates[0] + offset),
+                'y': str(coordinates[1] + y_coordinate_comment),
+            }
+        )
+    return comments_coordinates
+
+
+def create_first_fret_label(coor, instrument=GUITAR):
+    return {'style': STYLE_STRINGS['first_fret_label'],
+            'x': str(coor[0] - 7), 'y': str(coor[1] + instrument.fret_width / 2)}
+
+
+ROMAN_NUMERALS = ((100, 'C'), (90, 'XC'), (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I'))
+
+
+def fret_to_text(fret_number):
+    """Fret number as a roman numeral: 4 -> 'IV', 19 -> 'XIX'"""
+    if fret_number < 1:
+        return str(fret_number)
+    text = ''
+    for value, numeral in ROMAN_NUMERALS:
+        count, fret_number = divmod(fret_number, value)
+        text += numeral * count
+    return text
+
+
+def create_capo_path(coordinates, upper_lef_corner_grid, instrument=GUITAR):
+    length_string = upper_lef_corner_grid[1] - coordinates[1]
+    path = f'M {str(coordinates[0])} , {str(coordinates[1])} v {length_string}' + instrument.capo_tail(length_string)
+    return {'d': path, 'style': STYLE_STRINGS['capo_path']}
+
+
+def create_capo_label(coor):
+    return {'style': STYLE_STRINGS['capo_label'],
+            'x': str(coor[0] - 5), 'y': str(coor[1] + 4)}
+
+
+def createXAt(coordinates):
+    path = 'M ' + str(coordinates[0]) + ',' + str(coordinates[1]) + ' m 4,4 ' \
+                                                                    'l -8,-8 M ' + str(coordinates[0]) + ',' + str(
+        coordinates[1]) + '' \
+                          'm -4,4 l 8,-8'
+    return {'d': path, 'style': STYLE_STRINGS['mute']}
+
+
+def create0At(coor):
+    path = 'M ' + str(coor[0]) + ',' + str(coor[1]) + ' m -4,0 ' \
+                                                      'a 4,4 0 1, 0 8 0 a 4,4 0 1, 0 -8 0'
+    return {'d': path, 'style': STYLE_STRINGS['open']}
+
+
+def createStringPressedAt(coor):
+    path = 'M ' + str(coor[0]) + ',' + str(coor[1]) + ' m -6,0 ' \
+                                                      'a 6,6 0 1, 0 12 0 a 6,6 0 1, 0 -12 0'
+    return {'d': path, 'style': STYLE_STRINGS['dot']}
+
+
+def leftFingerNumberAt(coor):
+    return {'style': STYLE_STRINGS['finger_label'],
+            'x': str(coor[0]), 'y': str(coor[1])}
+
+
+def createBarreAt(coordinates_1, coordinates_2):
+    path = 'M ' + str(coordinates_1[0]) + ',' \
+           + str(coordinates_1[1]) + 'L' \
+           + str(coordinates_2[0]) + ',' \
+           + str(coordinates_2[1])
+    return {'d': path, 'style': STYLE_STRINGS['barre']}
+
+
+def split_strings_value(value, n_strings=None):
+    """'x32010', 'x-3-2-0-1-0' or ['x', 3, 2, 0, 1, 0] -> per string values, lowest string first"""
+    if isinstance(value, (list, tuple)):
+        values = [str(v) for v in value]
+    elif any(sep in value for sep in '-, '):
+        values = [v for v in value.replace(',', '-').replace(' ', '-').split('-') if v]
+    else:
+        values = list(value)
+    if n_strings is not None and len(values) != n_strings:
+        raise ValueError(f'Expected {n_strings} strings, got "{value}"')
+    if not 0 < len(values) <= len(STRING_ORDINALS):
+        raise ValueError(f'Expected at most {len(STRING_ORDINALS)} strings, got "{value}"')
+    return values
+
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes', 'y')
+    return bool(value)
+
+
+def chord_spec_to_options(spec):
+    """Converts a chord spec from a chords file into SVGGuitarChord option values.
+
+    Keys are the option names (header, nFrets, capoPos, firstStringFret, ...).
+    'frets' and 'fingers' set all strings at once, lowest string first: "x32010".
+    """
+    options = {}
+    n_strings = get_instrument(spec['instrument']).strings if spec.get('instrument') else None
+    for key, value in spec.items():
+        if value is None or value == '':
+            continue
+        if key in ('frets', 'fingers'):
+            suffix = 'Fret' if key == 'frets' else 'Finger'
+            for ordinal, v in zip(STRING_ORDINALS, reversed(split_strings_value(value, n_strings))):
+                options[f'{ordinal}String{suffix}'] = v.lower() if v in 'xX' else v
+        elif key in INT_OPTIONS:
+            options[key] = int(value)
+        elif key in BOOL_OPTIONS:
+            options[key] = to_bool(value)
+        elif key in STR_OPTIONS:
+            options[key] = str(value)
+        else:
+            raise ValueError(f'Unknown chord spec key "{key}"')
+    return options
+
+
+def load_chord_specs(file_name):
+    """Reads a list of chord specs from a .json (list of objects) or .csv (header row) file"""
+    with open(file_name, newline='', encoding='utf-8') as f:
+        if file_name.lower().endswith('.csv'):
+            specs = list(csv.DictReader(f))
+        else:
+            specs = json.load(f)
+    if not isinstance(specs, list):
+        raise ValueError('A chords file must contain a list of chords')
+    return [chord_spec_to_options(spec) for spec in specs]
+
+
+def batch_cell_coordinates(index, columns, cell_width, cell_height, origin=LAYER_ORIGIN):
+    row, column = divmod(index, max(columns, 1))
+    return [origin[0] + column * cell_width, origin[1] + row * cell_height]
+
+
+def batch_cell_width(chord_options):
+    return max((get_instrument(o.instrument).width for o in chord_options), default=0) + BATCH_CELL_PADDING
+
+
+def batch_cell_height(chord_options):
+    return max((o.nFrets * get_instrument(o.instrument).fret_width for o in chord_options),
+               default=0) + BATCH_CELL_MARGIN
+
+
+def path_primitive(attribs, kind):
+    return Primitive(PATH_TAG, attribs, None, kind)
+
+
+def text_primitive(attribs, text, kind):
+    return Primitive(TEXT_TAG, attribs, text, kind)
+
+
+# Shapes drawn once in <defs> and placed with <use> when useSymbols is set.
+# Grids get one symbol per number of frets and instrument: sgc-grid-4, sgc-grid-4-ukulele
+SYMBOL_PREFIX = 'sgc-'
+MARKER_SYMBOLS = {
+    'dot': createStringPressedAt,
+    'mute': createXAt,
+    'open': create0At,
+}
+
+
+def symbol_id(kind, length_in_frets=None, instrument=GUITAR):
+    if kind == 'grid':
+        suffix = '' if instrument is GUITAR else f'-{instrument.name}'
+        return f'{SYMBOL_PREFIX}grid-{length_in_frets}{suffix}'
+    return f'{SYMBOL_PREFIX}{kind}'
+
+
+def symbol_definition(symbol):
+    kind, _, grid = symbol[len(SYMBOL_PREFIX):].partition('-')
+    if kind == 'grid':
+        length_in_frets, _, instrument = grid.partition('-')
+        attribs = create_grid(int(length_in_frets), (0, 0), get_instrument(instrument))
+    else:
+        attribs = MARKER_SYMBOLS[kind]((0, 0))
+    return path_primitive({'id': symbol, **attribs}, kind)
+
+
+def use_primitive(symbol, coordinates, kind):
+    attribs = {XLINK_HREF: f'#{symbol}', 'x': str(coordinates[0]), 'y': str(coordinates[1])}
+    return Primitive(USE_TAG, attribs, None, kind)
+
+
+def symbol_ids(primitives):
+    return {p.attrib[XLINK_HREF][1:] for p in primitives if p.tag == USE_TAG}
+
+
+def with_class(primitive):
+    """The primitive with class= in place of its inline style"""
+    if 'style' not in primitive.attrib:
+        return primitive
+    attribs = {('class' if name == 'style' else name): (css_class(primitive.kind) if name == 'style' else value)
+               for name, value in primitive.attrib.items()}
+    return primitive._replace(attrib=attribs)
+
+
+def uses_classes(primitives):
+    return any('class' in p.attrib for p in primitives)
+
+
+PATH_TOKEN_RE = re.compile(r'[MmLlHhVvAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+NUMBER_ATTRIBUTES = ('x', 'y')
+
+
+def compact_number(value):
+    """'46.0' -> '46', '-0.0' -> '0', '12.50' -> '12.5'"""
+    number = float(value)
+    if number.is_integer():
+        return str(int(number))
+    return repr(number)
+
+
+def compact_path(d):
+    """'M 30 , 50.0 h 90' -> 'M30 50h90', the same path with fewer bytes"""
+    compact = []
+    for token in PATH_TOKEN_RE.findall(d):
+        if token.isalpha():
+            compact.append(token)
+            continue
+        token = compact_number(token)
+        # A minus sign separates numbers as well as a space
+        if compact and not compact[-1].isalpha() and not token.startswith('-'):
+            compact.append(' ')
+        compact.append(token)
+    return ''.join(compact)
+
+
+def compact_primitive(primitive):
+    attribs = {name: compact_number(value) if name in NUMBER_ATTRIBUTES else value
+               for name, value in primitive.attrib.items()}
+    if 'd' in attribs:
+        attribs['d'] = compact_path(attribs['d'])
+    return primitive._replace(attrib=attribs)
+
+
+def coalesce_primitives(primitives):
+    """Paths with the same attributes but d merged into one path, numbers compacted.
+
+    Every merged d starts with an absolute moveto, so the subpaths keep their places.
+    The merged path takes the place of the first one.
+    """
+    coalesced, merged = [], {}
+    for primitive in map(compact_primitive, primitives):
+        if primitive.tag != PATH_TAG or not primitive.attrib.get('d', '').startswith('M') \
+                or 'id' in primitive.attrib:
+            coalesced.append(primitive)
+            continue
+        key = tuple(sorted((name, value) for name, value in primitive.attrib.items() if name != 'd'))
+        if key in merged:
+            index = merged[key]
+            first = coalesced[index]
+            coalesced[index] = first._replace(attrib={**first.attrib, 'd': first.attrib['d'] + primitive.attrib['d']})
+        else:
+            merged[key] = len(coalesced)
+            coalesced.append(primitive)
+    return coalesced
+
+
+def capo_fret(options):
+    return int(options.capoPos) if options.capoPos != 'No' else 0
+
+
+def pressed_fret_coordinates(origin, number_string, number_fret, instrument=GUITAR):
+    shift = instrument.fret_width - 12
+    x = instrument.string_x(origin[0], number_string)
+    y = origin[1] + shift + (number_fret - 1) * instrument.fret_width
+    return x, y
+
+
+def finger_label_coordinates(origin, number_string, number_fret, instrument=GUITAR):
+    shift = instrument.fret_width - 7
+    x = instrument.string_x(origin[0], number_string) + 7
+    y = origin[1] + shift + (number_fret - 1) * instrument.fret_width + 5
+    return x, y
+
+
+def is_barre(frets, fingers, n_strings=GUITAR.strings):
+    """Finger 1 on the same fret of the first and the lowest string, inner strings not below it"""
+    if fingers.get(1) != 1 or fingers.get(n_strings) != 1 or 1 not in frets \
+            or frets.get(1) != frets.get(n_strings):
+        return False
+    inner = [frets[i] for i in range(2, n_strings) if i in frets]
+    return bool(inner) and all(f >= frets[1] for f in inner)
+
+
+class ChordLayout:
+    """Everything a diagram draws, parsed from the options and placed once.
+
+    Strings are numbered 1 (highest) to instrument.strings, coordinates are (x, y) tuples.
+    """
+    __slots__ = (
+        'options', 'origin', 'instrument', 'tuning', 'n_frets', 'first_fret', 'capo', 'has_capo',
+        'nut_visible', 'first_fret_label_visible', 'capo_visible',
+        'capo_corner', 'header', 'tuning_labels',
+        'muted', 'opened', 'pressed', 'fingers', 'finger_labels', 'barre',
+    )
+
+    def __init__(self, options, origin):
+        set_ = super().__setattr__
+        set_('options', options)
+        set_('origin', tuple(origin))
+        instrument = get_instrument(options.instrument)
+        set_('instrument', instrument)
+        set_('tuning', options.tuning or instrument.tuning)
+        set_('n_frets', options.nFrets)
+        set_('first_fret', options.firstFret)
+        capo = capo_fret(options)
+        set_('capo', capo)
+        has_capo = options.capoPos != 'No'
+        set_('has_capo', has_capo)
+        set_('nut_visible', options.firstFret == 1 and not has_capo)
+        set_('first_fret_label_visible', (options.firstFret != 1 and not has_capo)
+             or (has_capo and options.firstFret > capo + 1))
+        set_('capo_visible', has_capo and not options.firstFret > capo + 1)
+
+        x, y = origin
+        capo_corner = (x, y - 10) if self.capo_visible else (x, y)
+        set_('capo_corner', capo_corner)
+        header_margin = 25 if options.tuningTrue else 15
+        set_('header', (capo_corner[0] + instrument.half_width, capo_corner[1] - header_margin))
+        set_('tuning_labels', tuple((capo_corner[0] + offset, capo_corner[1] - 15)
+                                    for offset in instrument.string_offsets))
+
+        ordinals = STRING_ORDINALS[:instrument.strings]
+        frets = tuple(getattr(options, f'{ordinal}StringFret') for ordinal in ordinals)
+        fingers = tuple(getattr(options, f'{ordinal}StringFinger') for ordinal in ordinals)
+        x0_y = capo_corner[1] - 7
+
+        def x0_label(string_number):
+            return instrument.string_x(capo_corner[0], string_number), x0_y
+
+        set_('muted', tuple(x0_label(sn) for sn, sf in enumerate(frets, 1) if sf == 'x'))
+        set_('opened', tuple(x0_label(sn) for sn, sf in enumerate(frets, 1) if sf == '0'))
+        pressed_frets = {sn: int(sf) for sn, sf in enumerate(frets, 1) if sf.isdigit() and sf != '0'}
+        used_fingers = {sn: int(f) for sn, f in enumerate(fingers, 1) if f.isdigit()}
+        set_('pressed', tuple(pressed_fret_coordinates(origin, sn, sf, instrument)
+                              for sn, sf in pressed_frets.items()))
+        set_('fingers', tuple(used_fingers.get(sn) for sn in pressed_frets))
+        set_('finger_labels', tuple(finger_label_coordinates(origin, sn, sf, instrument)
+                                    for sn, sf in pressed_frets.items()))
+        lowest = instrument.strings
+        if is_barre(pressed_frets, used_fingers, lowest):
+            set_('barre', (pressed_fret_coordinates(origin, 1, pressed_frets[1], instrument),
+                           pressed_fret_coordinates(origin, lowest, pressed_frets[lowest], instrument)))
+        else:
+            set_('barre', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ChordLayout is immutable')
+
+
+class ChordGeometry:
+    """SVG primitives of one chord diagram.
+
+    Needs self.options (the SVGGuitarChord options) and self.upper_left_corner_grid.
+    Each *_primitives method returns the elements of one add_*_to_svg_tree stage,
+    all of them read the same ChordLayout.
+    """
+    STAGES = (
+        'grid',
+        'nut',
+        'first_fret_label',
+        'capo_label',
+        'capo_path',
+        'chord_label',
+        'tuning_labels',
+        'string_comment',
+        'mute_string_label',
+        'open_string_label',
+        'pressed_fret',
+        'left_hand_finger_lables',
+        'barre',
+    )
+    _layout = None
+
+    @property
+    def layout(self):
+        # Rebuilt only when the options or the position change, i.e. once per diagram
+        layout = self._layout
+        if layout is None or layout.options is not self.options \
+                or layout.origin != tuple(self.upper_left_corner_grid):
+            layout = self._layout = ChordLayout(self.options, self.upper_left_corner_grid)
+        return layout
+
+    def warn(self, message):
+        sys.stderr.write(message + '\n')
+
+    def marker_primitive(self, kind, coordinates):
+        if self.options.useSymbols:
+            return use_primitive(symbol_id(kind), coordinates, kind)
+        return path_primitive(MARKER_SYMBOLS[kind](coordinates), kind)
+
+    def grid_primitives(self):
+        layout = self.layout
+        if self.options.useSymbols:
+            return [use_primitive(symbol_id('grid', layout.n_frets, layout.instrument), layout.origin, 'grid')]
+        return [path_primitive(create_grid(layout.n_frets, layout.origin, layout.instrument), 'grid')]
+
+    def nut_primitives(self):
+        if self.layout.nut_visible:
+            return [path_primitive(create_nut(self.layout.origin, self.layout.instrument), 'nut')]
+        return []
+
+    def first_fret_label_primitives(self):
+        layout = self.layout
+        if layout.first_fret_label_visible:
+            attribs_firstFret = create_first_fret_label(layout.origin, layout.instrument)
+            return [text_primitive(attribs_firstFret, fret_to_text(layout.first_fret), 'first_fret_label')]
+        return []
+
+    def capo_label_primitives(self):
+        layout = self.layout
+        if layout.has_capo:
+            attribs_capoPos = create_capo_label(layout.capo_corner)
+            return [text_primitive(attribs_capoPos, 'C ' + fret_to_text(layout.capo), 'capo_label')]
+        return []
+
+    def capo_path_primitives(self):
+        layout = self.layout
+        if layout.capo_visible:
+            return [
+                path_primitive(create_nut(layout.capo_corner, layout.instrument), 'capo'),
+                path_primitive(create_capo_path(layout.capo_corner, layout.origin, layout.instrument), 'capo_path'),
+            ]
+        return []
+
+    def chord_label_primitives(self):
+        if self.options.headerTrue:
+            return [text_primitive(create_header(self.layout.header), self.options.header, 'header')]
+        return []
+
+    def tuning_labels_primitives(self):
+        primitives = []
+        if self.options.tuningTrue:
+            layout = self.layout
+            attribs_tuning = create_tuning_labels(layout.tuning_labels)
+            tuning = layout.tuning.split('-')
+            try:
+                for n in range(layout.instrument.strings):
+                    primitives.append(text_primitive(attribs_tuning[n], tuning[n], 'tuning_label'))
+            except IndexError:
+                self.warn(f"WARNING: Wrong tuning input.\nUse {layout.instrument.strings - 1} hyphens to separate notes. "
+                          f"Example: {layout.instrument.tuning}")
+        return primitives
+
+    def string_comment_primitives(self):
+        primitives = []
+        if self.options.perStringCommentsTrue:
+            layout = self.layout
+            attribs_psComments = create_per_string_comments(layout.origin, layout.n_frets, layout.instrument)
+            perStringComments = self.options.perStringComments.split('-')
+            try:
+                for n in range(layout.instrument.strings):
+                    primitives.append(text_primitive(attribs_psComments[n], perStringComments[n], 'string_comment'))
+            except IndexError:
+                self.warn(
+                    f"WARNING: Wrong comments input.\nUse {layout.instrument.strings - 1} hyphens as separators. "
+                    "A blank space leaves\na string without a comment. Example: R-5-R- - -5")
+        return primitives
+
+    def mute_string_label_primitives(self):
+        return [self.marker_primitive('mute', coordinates) for coordinates in self.layout.muted]
+
+    def open_string_label_primitives(self):
+        return [self.marker_primitive('open', coordinates) for coordinates in self.layout.opened]
+
+    def pressed_fret_primitives(self):
+        return [self.marker_primitive('dot', coordinates) for coordinates in self.layout.pressed]
+
+    def left_hand_finger_lables_primitives(self):
+        layout = self.layout
+        if not self.options.leftFingerNumberTrue:
+            return []
+        return [text_primitive(leftFingerNumberAt(coordinates), str(finger), 'finger_label')
+                for coordinates, finger in zip(layout.finger_labels, layout.fingers) if finger is not None]
+
+    def barre_primitives(self):
+        if self.layout.barre:
+            return [path_primitive(createBarreAt(*self.layout.barre), 'barre')]
+        return []
+
+    def stage_primitives(self, stage):
+        primitives = getattr(self, f'{stage}_primitives')()
+        if self.options.coalescePaths:
+            primitives = coalesce_primitives(primitives)
+        if self.options.useClasses:
+            return [with_class(p) for p in primitives]
+        return primitives
+
+    def chord_primitives(self):
+        for stage in self.STAGES:
+            yield from self.stage_primitives(stage)
+
+
+class ChordDiagram(ChordGeometry):
+    """A chord diagram built from a chord spec (see chord_spec_to_options), no inkex.Effect needed"""
+
+    def __init__(self, spec=None, origin=DOCUMENT_ORIGIN):
+        self.options = argparse.Namespace(**{**DEFAULT_OPTIONS, **chord_spec_to_options(spec or {})})
+        self.upper_left_corner_grid = list(origin)
+
+    @classmethod
+    def from_options(cls, options, origin=LAYER_ORIGIN):
+        diagram = cls()
+        diagram.options = argparse.Namespace(**vars(options))
+        diagram.upper_left_corner_grid = list(origin)
+        return diagram
+
+
+NS_PREFIXES = {XLINK_NS: 'xlink'}
+
+
+def local_name(tag):
+    namespace, _, name = tag[1:].rpartition('}') if tag.startswith('{') else ('', '', tag)
+    return f'{NS_PREFIXES[namespace]}:{name}' if namespace in NS_PREFIXES else name
+
+
+# xml.sax.saxutils.escape would do, but importing it imports urllib.request
+TEXT_ENTITIES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'))
+ATTRIB_ENTITIES = TEXT_ENTITIES + (('"', '&quot;'), ('\n', '&#10;'), ('\r', '&#13;'), ('\t', '&#9;'))
+
+
+def escape(text, entities=TEXT_ENTITIES):
+    for char, entity in entities:
+        text = text.replace(char, entity)
+    return text
+
+
+def attrib_escape(value):
+    return escape(str(value), ATTRIB_ENTITIES)
+
+
+def primitive_to_svg(primitive):
+    attribs = ''.join(f' {local_name(name)}="{attrib_escape(value)}"' for name, value in primitive.attrib.items())
+    tag = local_name(primitive.tag)
+    if primitive.text is None:
+        return f'<{tag}{attribs}/>'
+    return f'<{tag}{attribs}>{escape(primitive.text)}</{tag}>'
+
+
+def primitives_size(primitives):
+    return sum(len(primitive_to_svg(p).encode('utf-8')) for p in primitives)
+
+
+def definitions(primitives):
+    """What a document with these primitives needs in <defs>: stylesheet and symbols"""
+    return needed_definitions(symbol_ids(primitives), uses_classes(primitives))
+
+
+def needed_definitions(symbols, classes):
+    needed = [stylesheet_primitive()] if classes else []
+    return needed + [symbol_definition(s) for s in sorted(symbols)]
+
+
+def defs_to_svg(definitions):
+    if not definitions:
+        return ''
+    return f'<defs>{"".join(primitive_to_svg(p) for p in definitions)}</defs>'
+
+
+def symbol_savings(diagrams):
+    """Serialized size in bytes of the diagrams inline and with <defs>/<use> symbols, options left as they were"""
+    inline_bytes = symbols_bytes = 0
+    primitives = []
+    for diagram in diagrams:
+        warn, use_symbols = diagram.warn, diagram.options.useSymbols
+        # Drawn again for the report only, its warnings were given when it was drawn
+        diagram.warn = lambda message: None
+        try:
+            diagram.options.useSymbols = False
+            inline_bytes += primitives_size(diagram.chord_primitives())
+            diagram.options.useSymbols = True
+            diagram_primitives = list(diagram.chord_primitives())
+        finally:
+            diagram.warn = warn
+            diagram.options.useSymbols = use_symbols
+        symbols_bytes += primitives_size(diagram_primitives)
+        primitives += [p for p in diagram_primitives if p.tag == USE_TAG]
+    return inline_bytes, symbols_bytes + len(defs_to_svg(definitions(primitives)).encode('utf-8'))
+
+
+def coalesce_savings(diagram):
+    """(elements, bytes) of the diagram as drawn without and with coalescePaths, its options are left as they were"""
+    warn, coalesce_paths = diagram.warn, diagram.options.coalescePaths
+    diagram.warn = lambda message: None
+    sizes = []
+    try:
+        for coalesce in (False, True):
+            diagram.options.coalescePaths = coalesce
+            primitives = list(diagram.chord_primitives())
+            sizes.append((len(primitives), primitives_size(primitives)))
+    finally:
+        diagram.warn = warn
+        diagram.options.coalescePaths = coalesce_paths
+    return sizes
+
+
+def document_size(diagram):
+    instrument = diagram.layout.instrument
+    width = diagram.upper_left_corner_grid[0] + instrument.width + 30
+    height = diagram.upper_left_corner_grid[1] + diagram.options.nFrets * instrument.fret_width + 30
+    return width, height
+
+
+def svg_start_tag(width, height, xlink):
+    xlink = f' xmlns:xlink="{XLINK_NS}"' if xlink else ''
+    return f'<svg xmlns="{SVG_NS}"{xlink} width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+
+
+def render_chord(spec=None, origin=DOCUMENT_ORIGIN):
+    """Chord spec -> standalone SVG document as a string"""
+    diagram = ChordDiagram(spec, origin)
+    width, height = document_size(diagram)
+    primitives = list(diagram.chord_primitives())
+    body = ''.join(primitive_to_svg(p) for p in primitives)
+    return f'{svg_start_tag(width, height, symbol_ids(primitives))}{defs_to_svg(definitions(primitives))}{body}</svg>'
+
+
+def chord_book_options(specs):
+    for spec in specs:
+        yield argparse.Namespace(**{**DEFAULT_OPTIONS, **chord_spec_to_options(spec)})
+
+
+def chord_book_size(specs, columns, origin=DOCUMENT_ORIGIN):
+    """(cell width, cell height, document width, document height) of specs laid out in columns"""
+    cell_width = batch_cell_width(chord_book_options(specs))
+    cell_height = batch_cell_height(chord_book_options(specs))
+    rows = -(-len(specs) // columns)
+    return cell_width, cell_height, origin[0] + min(columns, len(specs)) * cell_width, origin[1] + rows * cell_height
+
+
+def chord_book_diagrams(specs, columns, origin=DOCUMENT_ORIGIN):
+    columns = max(columns, 1)
+    cell_width, cell_height, _, _ = chord_book_size(specs, columns, origin)
+    for index, spec in enumerate(specs):
+        yield ChordDiagram(spec, batch_cell_coordinates(index, columns, cell_width, cell_height, origin))
+
+
+def iter_chord_book(specs, columns=4, origin=DOCUMENT_ORIGIN):
+    """Chord specs -> one SVG document in pieces, a <g> per chord as soon as it is drawn.
+
+    The <defs> come last, the symbols in use are known after the last chord.
+    """
+    _, _, width, height = chord_book_size(specs, max(columns, 1), origin)
+    yield svg_start_tag(width, height, xlink=True)
+    symbols, classes = set(), False
+    for diagram in chord_book_diagrams(specs, columns, origin):
+        primitives = list(diagram.chord_primitives())
+        symbols |= symbol_ids(primitives)
+        classes = classes or uses_classes(primitives)
+        yield f'<g>{"".join(primitive_to_svg(p) for p in primitives)}</g>'
+    yield f'{defs_to_svg(needed_definitions(symbols, classes))}</svg>'
+
+
+def write_chord_book(specs, file_name, columns=4, origin=DOCUMENT_ORIGIN):
+    """Writes iter_chord_book to file_name, memory does not grow with the number of chords"""
+    with open(file_name, 'w', encoding='utf-8') as f:
+        for piece in iter_chord_book(specs, columns, origin):
+            f.write(piece)
+
+
+def append_primitives(parent, primitives):
+    from lxml import etree
+    for primitive in primitives:
+        element = etree.SubElement(parent, primitive.tag, primitive.attrib)
+        if primitive.text is not None:
+            element.text = primitive.text
+
+
+def insert_primitives(parent, index, primitives):
+    for offset, primitive in enumerate(primitives):
+        element = parent.makeelement(primitive.tag, primitive.attrib)
+        if primitive.text is not None:
+            element.text = primitive.text
+        parent.insert(index + offset, element)
+
+
+# A diagram drawn by the extension is a <g> with its options and the number of elements of every stage
+SPEC_ATTRIBUTE = 'data-sgc-spec'
+STAGES_ATTRIBUTE = 'data-sgc-stages'
+
+
+def options_to_spec(options):
+    return {name: getattr(options, name) for name in sorted(DEFAULT_OPTIONS)}
+
+
+def spec_to_attribute(options):
+    """Options differing from DEFAULT_OPTIONS as compact JSON"""
+    spec = {name: value for name, value in options_to_spec(options).items() if value != DEFAULT_OPTIONS[name]}
+    return json.dumps(spec, sort_keys=True, separators=(',', ':'))
+
+
+def attribute_to_options(value):
+    """data-sgc-spec -> options, ValueError when it is not a spec"""
+    try:
+        spec = json.loads(value or '')
+    except json.JSONDecodeError as error:
+        raise ValueError(f'Invalid chord spec: {error}')
+    if not isinstance(spec, dict) or set(spec) - set(DEFAULT_OPTIONS):
+        raise ValueError('Invalid chord spec')
+    return argparse.Namespace(**{**DEFAULT_OPTIONS, **spec})
+
+
+def stage_slices(value, n_children):
+    """data-sgc-stages -> [(start, end)] of the children of each stage, ValueError when it does not fit"""
+    try:
+        counts = [int(count) for count in (value or '').split(',')]
+    except ValueError:
+        raise ValueError(f'Invalid stage counts "{value}"')
+    if len(counts) != len(ChordGeometry.STAGES) or min(counts) < 0 or sum(counts) != n_children:
+        raise ValueError(f'Stage counts "{value}" do not match {n_children} elements')
+    slices, start = [], 0
+    for count in counts:
+        slices.append((start, start + count))
+        start += count
+    return slices
+
+
+def set_diagram_attributes(group, options, counts):
+    group.set(SPEC_ATTRIBUTE, spec_to_attribute(options))
+    group.set(STAGES_ATTRIBUTE, ','.join(str(count) for count in counts))
+
+
+def render_chord_element(spec=None, origin=DOCUMENT_ORIGIN):
+    """Chord spec -> standalone SVG document as an lxml element"""
+    from lxml import etree
+    diagram = ChordDiagram(spec, origin)
+    width, height = document_size(diagram)
+    primitives = list(diagram.chord_primitives())
+    nsmap = {None: SVG_NS, 'xlink': XLINK_NS} if symbol_ids(primitives) else {None: SVG_NS}
+    root = etree.Element(f'{{{SVG_NS}}}svg', nsmap=nsmap,
+                         width=str(width), height=str(height), viewBox=f'0 0 {width} {height}')
+    defs = definitions(primitives)
+    if defs:
+        append_primitives(etree.SubElement(root, f'{{{SVG_NS}}}defs'), defs)
+    append_primitives(root, primitives)
+    return root
+
+
+def chord_book_element(specs, columns=4, origin=DOCUMENT_ORIGIN):
+    """The document of iter_chord_book as an lxml element"""
+    from lxml import etree
+    _, _, width, height = chord_book_size(specs, max(columns, 1), origin)
+    root = etree.Element(f'{{{SVG_NS}}}svg', nsmap={None: SVG_NS, 'xlink': XLINK_NS},
+                         width=str(width), height=str(height), viewBox=f'0 0 {width} {height}')
+    primitives = []
+    for diagram in chord_book_diagrams(specs, columns, origin):
+        diagram_primitives = list(diagram.chord_primitives())
+        append_primitives(etree.SubElement(root, GROUP_TAG), diagram_primitives)
+        primitives += diagram_primitives
+    defs = definitions(primitives)
+    if defs:
+        append_primitives(etree.SubElement(root, f'{{{SVG_NS}}}defs'), defs)
+    return root
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+chord_server.py
+HTTP server of chord diagrams for web pages, without Inkscape.
+
+    python3 chord_server.py --port 8080 --workers 4 --cache-size 10000
+    curl 'http://localhost:8080/chord.svg?frets=x32010&fingers=x32010&capo=2&header=C'
+
+Query parameters are the keys of a chords file (frets, fingers, header,
+firstFret, nFrets, capoPos, tuning, instrument, ...); capo and name are
+short for capoPos and header. /chord.png takes a scale as well. Values a
+diagram cannot show (frets off the grid, a fret count that is not the
+instrument's, more than MAX_FRETS frets) get 400 Bad Request.
+
+Responses are kept in memory, least recently used dropped first, and
+carry an ETag: a request with a matching If-None-Match gets 304 Not
+Modified. Diagrams not in memory are drawn by a pool of processes; while
+one is being drawn, the same request from other clients waits for it
+instead of drawing it again. /stats returns the counters as JSON. A kept
+alive connection without a request for IDLE_TIMEOUT seconds is closed.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import hashlib
+import json
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from chord_render import (
+    DEFAULT_OPTIONS,
+    GUITAR,
+    STRING_ORDINALS,
+    capo_fret,
+    chord_spec_to_options,
+    get_instrument,
+    render_chord,
+)
+
+CONTENT_TYPES = {'/chord.svg': 'image/svg+xml', '/chord.png': 'image/png'}
+QUERY_ALIASES = {'capo': 'capoPos', 'name': 'header'}
+MAX_SCALE = 8.0
+# Highest nFrets, firstFret and capo fret of a query
+MAX_FRETS = 24
+# 0 is no finger, as on an open string
+FINGERS = ('0', '1', '2', '3', '4')
+MAX_HEADER_BYTES = 16 * 2 ** 10
+# Larger request bodies are not read, the connection is closed after the response
+MAX_BODY_BYTES = 64 * 2 ** 10
+# Seconds a kept alive connection may wait for its next request, or a request for its body
+IDLE_TIMEOUT = 30.0
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+
+
+def render_job(path, spec, scale):
+    """Runs in a worker process: file bytes of one diagram"""
+    if path == '/chord.png':
+        # numpy is only needed for PNG files
+        from chord_raster import render_png
+        return render_png(spec, scale)
+    return render_chord(spec).encode('utf-8')
+
+
+def check_options(options):
+    """ValueError for option values a diagram cannot show: frets off the grid, unknown fingers, huge grids"""
+    options = {**DEFAULT_OPTIONS, **options}
+    instrument = get_instrument(options['instrument'])
+    for name in ('nFrets', 'firstFret'):
+        if not 1 <= options[name] <= MAX_FRETS:
+            raise ValueError(f'{name} must be between 1 and {MAX_FRETS}')
+    try:
+        capo = capo_fret(argparse.Namespace(**options))
+    except ValueError:
+        raise ValueError('capo must be No or a fret number') from None
+    if not 0 <= capo <= MAX_FRETS:
+        raise ValueError(f'capo must be between 0 and {MAX_FRETS}')
+    if options['tuning'] and len(options['tuning'].split('-')) != instrument.strings:
+        raise ValueError(f'tuning must have {instrument.strings} notes for {instrument.name}')
+    for ordinal in STRING_ORDINALS[:instrument.strings]:
+        fret, finger = options[f'{ordinal}StringFret'], options[f'{ordinal}StringFinger']
+        if fret != 'x' and not (fret.isdigit() and int(fret) <= options['nFrets']):
+            raise ValueError(f'{ordinal} string: fret "{fret}" is not x or 0 to nFrets')
+        if finger != 'x' and finger not in FINGERS:
+            raise ValueError(f'{ordinal} string: finger "{finger}" is not x or one of {", ".join(FINGERS)}')
+
+
+def query_to_spec(query):
+    """'frets=x32010&capo=2' -> (chord spec, scale), ValueError for unknown keys or values"""
+    spec, scale = {}, 1.0
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        if name == 'scale':
+            try:
+                scale = float(value)
+            except ValueError:
+                raise ValueError('scale must be a number') from None
+            if not 0 < scale <= MAX_SCALE:
+                raise ValueError(f'scale must be between 0 and {MAX_SCALE}')
+            continue
+        spec[QUERY_ALIASES.get(name, name)] = value
+    # frets and fingers are counted against the strings of the instrument, a guitar by default
+    spec['instrument'] = spec.get('instrument') or GUITAR.name
+    # Raises for unknown keys and bad values before anything is drawn
+    check_options(chord_spec_to_options(spec))
+    return spec, scale
+
+
+def etag(body):
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class RenderCache:
+    """In memory LRU of (body, etag) by key, limited in entries"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, body):
+        entry = self._entries[key] = body, etag(body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+
+class ChordServer:
+
+    def __init__(self, workers=None, cache_size=10000, idle_timeout=IDLE_TIMEOUT):
+        # workers=0 draws in the server process, for one CPU or debugging
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+        self.cache = RenderCache(cache_size)
+        self.idle_timeout = idle_timeout
+        self.pending = {}
+        self.stats = collections.Counter()
+
+    async def render(self, path, query):
+        """(body, etag) of a diagram: from memory, from a render in progress or drawn now.
+
+        Requests are told apart by their query string, parsed only when the diagram is not in memory.
+        """
+        key = path, query
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.stats['hits'] += 1
+            return entry
+        future = self.pending.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+        spec, scale = query_to_spec(query)
+        self.stats['renders'] += 1
+        future = self.pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            if self.executor is None:
+                body = render_job(path, spec, scale)
+            else:
+                body = await asyncio.get_running_loop().run_in_executor(self.executor, render_job, path, spec, scale)
+            entry = self.cache.put(key, body)
+            future.set_result(entry)
+        except Exception as error:
+            future.set_exception(error)
+            # Retrieved here so that a render nobody else waited for is not reported as unhandled
+            future.exception()
+            raise
+        finally:
+            del self.pending[key]
+            # Cancelled while drawing (CancelledError is no Exception): the requests waiting for it end too
+            if not future.done():
+                future.cancel()
+        return entry
+
+    async def respond(self, method, target, headers):
+        """(status, headers, body) of one request"""
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b''
+        url = urlsplit(target)
+        if url.path == '/stats':
+            counters = {**self.stats, 'cached': len(self.cache), 'pending': len(self.pending)}
+            return 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-store'}, \
+                json.dumps(counters).encode('utf-8')
+        if url.path not in CONTENT_TYPES:
+            return 404, {}, b''
+        try:
+            body, tag = await self.render(url.path, url.query)
+        except ValueError as error:
+            self.stats['bad_requests'] += 1
+            return 400, {'Content-Type': 'text/plain; charset=utf-8'}, f'{error}\n'.encode('utf-8')
+        except Exception as error:
+            self.stats['errors'] += 1
+            return 500, {'Content-Type': 'text/plain; charset=utf-8'}, f'{error}\n'.encode('utf-8')
+        response_headers = {'Content-Type': CONTENT_TYPES[url.path], 'ETag': tag,
+                            'Cache-Control': 'public, max-age=86400'}
+        if_none_match = headers.get('if-none-match', '')
+        if if_none_match == '*' or tag in (t.strip() for t in if_none_match.split(',')):
+            self.stats['not_modified'] += 1
+            return 304, response_headers, b''
+        return 200, response_headers, body
+
+    async def handle(self, reader, writer):
+        """One connection, several requests when the client keeps it alive"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.idle_timeout)
+                except asyncio.LimitOverrunError:
+                    await self.write(writer, 431, {}, b'', False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    await self.write(writer, 400, {}, b'', False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                # A request body is read and dropped, so that it is not taken for the next request
+                length = headers.get('content-length', '0')
+                if 'transfer-encoding' in headers or not length.isdigit():
+                    await self.write(writer, 400, {}, b'', False)
+                    break
+                if int(length) > MAX_BODY_BYTES:
+                    keep_alive = False
+                elif int(length):
+                    try:
+                        await asyncio.wait_for(reader.readexactly(int(length)), self.idle_timeout)
+                    except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                        break
+                self.stats['requests'] += 1
+                status, response_headers, body = await self.respond(method, target, headers)
+                await self.write(writer, status, response_headers, body if method != 'HEAD' else None,
+                                 keep_alive, len(body))
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def write(writer, status, headers, body, keep_alive, length=None):
+        head = [f'HTTP/1.1 {status} {REASONS[status]}']
+        headers = {**headers, 'Content-Length': str(len(body or b'') if length is None else length),
+                   'Connection': 'keep-alive' if keep_alive else 'close'}
+        if status == 304:
+            del headers['Content-Length']
+        head += [f'{name}: {value}' for name, value in headers.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + (body or b''))
+        await writer.drain()
+
+    async def serve(self, host, port):
+        # SIGTERM stops serving like Ctrl+C does, main() then ends the drawing processes
+        with contextlib.suppress(NotImplementedError):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES)
+        addresses = ', '.join(f'{s.getsockname()[0]}:{s.getsockname()[1]}' for s in server.sockets)
+        print(f'Serving chord diagrams on {addresses}', flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        # Waits for the diagrams being drawn; cancel_futures would need Python 3.9
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def create_parser(args):
+    parser = argparse.ArgumentParser(description='Serve chord diagrams over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='drawing processes, default: number of CPUs, 0: draw in the server process')
+    parser.add_argument('--cache-size', type=int, default=10000, help='diagrams kept in memory')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='seconds before an idle connection is closed')
+    return parser.parse_args(args)
+
+
+def main(args):
+    name_space = create_parser(args)
+    server = ChordServer(name_space.workers, name_space.cache_size, name_space.idle_timeout)
+    try:
+        asyncio.run(server.serve(name_space.host, name_space.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
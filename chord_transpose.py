@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+chord_transpose.py
+All transpositions and capo positions of the chords of a song, as a chords file or one chord book.
+
+    python3 chord_transpose.py song.json -o variants.json
+    python3 chord_transpose.py song.json --shifts 0 2 5 --capos 0 2 3 --book variants.svg --columns 8
+
+Every chord keeps its shape. A transposition by t semitones with the capo
+on fret c moves the shape t - c frets (capo of the chord itself included),
+or 12 frets less when that stays on the neck. Open strings of a shape moved
+up become a barre of finger 1. The frets of all chords, semitones and capo
+positions are computed at once as numpy arrays; a variant is dropped when
+it leaves the neck or needs more fingers than the hand has. firstFret and
+nFrets are chosen again for every variant, which also decides whether the
+nut or the capo is drawn.
+
+Headers name the shape, as on a song sheet with a capo: a G shape with the
+capo on fret 2 is "G", though it sounds A. The header of a variant moves by
+as many semitones as its shape: that G without a capo is "A", and two
+semitones up with the capo on fret 4 it is "G" again.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from chord_render import (
+    DEFAULT_OPTIONS,
+    STRING_ORDINALS,
+    capo_fret,
+    chord_spec_to_options,
+    get_instrument,
+    load_chord_specs,
+    write_chord_book,
+)
+from chord_voicings import CHORD_RE, NOTE_NAMES, fingers_needed, note_to_pitch_class
+
+MUTED = -1
+NO_FINGER = 0
+MAX_STRINGS = len(STRING_ORDINALS)
+FLAT_NOTE_NAMES = ('C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B')
+SHIFTS = tuple(range(12))
+CAPOS = tuple(range(8))
+
+
+def transpose_note(note, semitones):
+    names = FLAT_NOTE_NAMES if note.endswith('b') else NOTE_NAMES
+    return names[(note_to_pitch_class(note) + semitones) % 12]
+
+
+def transpose_chord_name(name, semitones):
+    """'F#m7/C#' up 2 -> 'G#m7/D#', names that are not chords are kept"""
+    match = CHORD_RE.match(name.strip())
+    if not match:
+        return name
+    root_letter, accidental, quality, bass = match.groups()
+    name = transpose_note(root_letter + accidental, semitones) + quality
+    if bass:
+        name += '/' + transpose_note(bass, semitones)
+    return name
+
+
+def spec_shapes(specs):
+    """Chord specs -> arrays of (specs, MAX_STRINGS), lowest string first, and the options of every spec.
+
+    Shape frets count from the capo (or the nut): 0 is an open string, MUTED a muted one.
+    Fingers are NO_FINGER where none is given; strings an instrument does not have are muted.
+    """
+    shapes = np.full((len(specs), MAX_STRINGS), MUTED)
+    fingers = np.full((len(specs), MAX_STRINGS), NO_FINGER)
+    all_options = []
+    for row, spec in enumerate(specs):
+        options = {**DEFAULT_OPTIONS, **chord_spec_to_options(spec)}
+        ordinals = list(reversed(STRING_ORDINALS[:get_instrument(options['instrument']).strings]))
+        capo = capo_fret(argparse.Namespace(**options))
+        # The frets of a diagram count from the top of its grid: the capo or the fret before firstFret
+        base = max(options['firstFret'] - 1, capo) - capo
+        for column, ordinal in enumerate(ordinals):
+            fret = options[f'{ordinal}StringFret']
+            finger = options[f'{ordinal}StringFinger']
+            if fret.isdigit():
+                shapes[row, column] = int(fret) + base if int(fret) else 0
+            if finger.isdigit() and fret.isdigit() and int(fret):
+                fingers[row, column] = int(finger)
+        all_options.append(options)
+    return shapes, fingers, all_options
+
+
+def transpose_shapes(shapes, fingers, capos, shifts=SHIFTS, to_capos=CAPOS, max_fret=15, max_fingers=4):
+    """Shapes of every chord for every shift and capo, arrays of (specs, shifts, capos, strings).
+
+    Returns the shape frets, the fingers and a (specs, shifts, capos) mask of the playable variants.
+    """
+    shifts = np.asarray(shifts)[None, :, None]
+    to_capos = np.asarray(to_capos)[None, None, :]
+    sounding = shapes != MUTED
+    lowest = np.where(sounding, shapes, max_fret).min(axis=1)[:, None, None]
+    move = capos[:, None, None] + shifts - to_capos
+    # The same chord an octave lower when the shape stays on the neck there
+    move = np.where(lowest + move - 12 >= 0, move - 12, move)
+    valid = (lowest + move >= 0) & sounding.any(axis=1)[:, None, None]
+
+    moved = np.where(sounding[:, None, None, :], shapes[:, None, None, :] + move[..., None], MUTED)
+    valid &= (to_capos + moved.max(axis=-1) <= max_fret)
+
+    # Open strings of a shape moved up are barred by finger 1, the other fingers move one up
+    barred = (shapes == 0)[:, None, None, :] & (moved > 0)
+    has_fingers = (fingers != NO_FINGER).any(axis=1)[:, None, None, None]
+    new_fingers = np.where(barred.any(axis=-1, keepdims=True),
+                           np.where(barred, 1, np.where(fingers[:, None, None, :] != NO_FINGER,
+                                                        fingers[:, None, None, :] + 1, NO_FINGER)),
+                           fingers[:, None, None, :])
+    new_fingers = np.where(has_fingers & (moved > 0), new_fingers, NO_FINGER)
+    needed, _ = fingers_needed(moved.reshape(-1, MAX_STRINGS))
+    valid &= (needed.reshape(valid.shape) <= max_fingers) & (new_fingers.max(axis=-1) <= max_fingers)
+    return moved, new_fingers, valid
+
+
+def diagram_window(frets, n_frets):
+    """(firstFret, nFrets, frets as drawn) for shape frets of one variant"""
+    fretted = [f for f in frets if f > 0]
+    if not fretted or max(fretted) <= n_frets:
+        return 1, n_frets, frets
+    lowest = min(fretted)
+    shown = [f - lowest + 1 if f > 0 else f for f in frets]
+    return lowest, max(n_frets, max(fretted) - lowest + 1), shown
+
+
+def variant_spec(options, semitones, capo, frets, fingers):
+    """Chords file entry of one variant, named after its shape: the header moves by the semitones the shape moved"""
+    n_strings = get_instrument(options['instrument']).strings
+    frets, fingers = frets[:n_strings].tolist(), fingers[:n_strings].tolist()
+    lowest, n_frets, shown = diagram_window(frets, options['nFrets'])
+    spec = {
+        'instrument': options['instrument'],
+        'header': transpose_chord_name(options['header'], semitones),
+        'frets': '-'.join('x' if f == MUTED else str(f) for f in shown),
+        'firstFret': capo + lowest if lowest > 1 else 1,
+        'nFrets': n_frets,
+        'capoPos': str(capo) if capo else 'No',
+    }
+    if any(fingers):
+        spec['fingers'] = '-'.join('x' if f == NO_FINGER else str(f) for f in fingers)
+    # Labels and display options of the original chord
+    for key in ('headerTrue', 'tuningTrue', 'tuning', 'perStringCommentsTrue', 'perStringComments',
+                'leftFingerNumberTrue'):
+        if options[key] != DEFAULT_OPTIONS[key]:
+            spec[key] = options[key]
+    return spec
+
+
+def transposed_specs(specs, shifts=SHIFTS, capos=CAPOS, max_fret=15, max_fingers=4):
+    """Chord specs of every playable transposition and capo position: spec by spec, shift by shift"""
+    if not specs:
+        return []
+    shapes, fingers, all_options = spec_shapes(specs)
+    from_capos = np.array([capo_fret(argparse.Namespace(**options)) for options in all_options])
+    moved, new_fingers, valid = transpose_shapes(shapes, fingers, from_capos, shifts, capos, max_fret, max_fingers)
+    # A shape moves by the transposition plus the frets the capo went down
+    return [variant_spec(all_options[i], int(shifts[j] + from_capos[i] - capos[k]), capos[k], moved[i, j, k],
+                         new_fingers[i, j, k])
+            for i, j, k in zip(*np.nonzero(valid))]
+
+
+def create_parser(args):
+    parser = argparse.ArgumentParser(description='All transpositions and capo positions of chords.')
+    parser.add_argument('chords_files', nargs='+', help='JSON or CSV chords files')
+    parser.add_argument('--shifts', type=int, nargs='+', default=list(SHIFTS), help='semitones up, default 0-11')
+    parser.add_argument('--capos', type=int, nargs='+', default=list(CAPOS),
+                        help='capo frets, 0 for none, default 0-7')
+    parser.add_argument('--max-fret', type=int, default=15, help='highest fret a variant may use')
+    parser.add_argument('--max-fingers', type=int, default=4)
+    parser.add_argument('--book', help='write the variants into this SVG file')
+    parser.add_argument('--columns', type=int, default=8, help='chords per row of --book')
+    parser.add_argument('-o', '--output', default='-', help='chords file to write, default: stdout')
+    return parser.parse_args(args)
+
+
+def main(args):
+    name_space = create_parser(args)
+    specs = []
+    for chords_file in name_space.chords_files:
+        specs.extend(load_chord_specs(chords_file))
+    variants = transposed_specs(specs, name_space.shifts, name_space.capos, name_space.max_fret,
+                                name_space.max_fingers)
+    if name_space.book:
+        write_chord_book(variants, name_space.book, name_space.columns)
+        print(f'{len(variants)} chords written to {name_space.book}')
+        return
+    text = json.dumps(variants, indent=1)
+    if name_space.output == '-':
+        print(text)
+    else:
+        with open(name_space.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+chord_voicings.py
+Finds playable fingerings of a chord symbol for svgGuitarChord.
+
+    python3 chord_voicings.py F#m7b5 --tuning E-A-D-G-B-E --limit 8 -o voicings.json
+
+The output is a chords file. Every shape the hand can play in a fret window
+(stretch, number of fingers, barre) is enumerated once per tuning with numpy,
+one string at a time so that partial shapes out of reach are dropped early.
+Chords are then matched against these shapes with bit masks of pitch classes,
+so searching all qualities in all 12 keys takes well under a second.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import functools
+import json
+import re
+import sys
+
+import numpy as np
+
+from chord_render import DEFAULT_OPTIONS, GUITAR, get_instrument
+
+MUTED = -1
+NOTES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+# Intervals in semitones above the root
+QUALITIES = {
+    '': (0, 4, 7),
+    'm': (0, 3, 7),
+    '5': (0, 7),
+    'dim': (0, 3, 6),
+    'aug': (0, 4, 8),
+    '+': (0, 4, 8),
+    'sus2': (0, 2, 7),
+    'sus4': (0, 5, 7),
+    '6': (0, 4, 7, 9),
+    'm6': (0, 3, 7, 9),
+    '7': (0, 4, 7, 10),
+    'maj7': (0, 4, 7, 11),
+    'm7': (0, 3, 7, 10),
+    'mmaj7': (0, 3, 7, 11),
+    'm7b5': (0, 3, 6, 10),
+    'dim7': (0, 3, 6, 9),
+    '7sus4': (0, 5, 7, 10),
+    '7b5': (0, 4, 6, 10),
+    '7#5': (0, 4, 8, 10),
+    'add9': (0, 2, 4, 7),
+    '9': (0, 2, 4, 7, 10),
+    'm9': (0, 2, 3, 7, 10),
+    'maj9': (0, 2, 4, 7, 11),
+    '7b9': (0, 1, 4, 7, 10),
+    '7#9': (0, 3, 4, 7, 10),
+    '11': (0, 2, 5, 7, 10),
+    '13': (0, 4, 7, 9, 10),
+}
+QUALITY_ALIASES = {'M': '', 'maj': '', 'min': 'm', '-': 'm', 'o': 'dim', 'o7': 'dim7', 'ø': 'm7b5',
+                   'M7': 'maj7', 'Δ': 'maj7', 'Δ7': 'maj7', 'min7': 'm7', '-7': 'm7', 'sus': 'sus4'}
+# No chord has more pitch classes, a shape sounding more of them never matches
+MAX_CHORD_NOTES = max(len(intervals) for intervals in QUALITIES.values())
+POPCOUNT = np.array([bin(bits).count('1') for bits in range(1 << 12)], dtype=np.int8)
+CHORD_RE = re.compile(r'^([A-G])([#b]?)(.*?)(?:/([A-G][#b]?))?$')
+# Tunings whose strings do not rise from the lowest string, with the octave of every string
+REENTRANT_TUNINGS = {'G-C-E-A': 'G4-C4-E4-A4'}
+
+
+def note_to_pitch_class(note):
+    note = note.strip()
+    if not note or note[0].upper() not in NOTES:
+        raise ValueError(f'Unknown note "{note}"')
+    pitch_class = NOTES[note[0].upper()]
+    for accidental in note[1:]:
+        if accidental == '#':
+            pitch_class += 1
+        elif accidental == 'b':
+            pitch_class -= 1
+        else:
+            raise ValueError(f'Unknown note "{note}"')
+    return pitch_class % 12
+
+
+def split_octave(note):
+    """'G4' -> ('G', 4), 'F#' -> ('F#', None)"""
+    note = note.strip()
+    name = note.rstrip('0123456789')
+    return name, int(note[len(name):]) if len(name) < len(note) else None
+
+
+def parse_tuning(tuning):
+    """'E-A-D-G-B-E' -> open string pitch classes, lowest (6th) string first"""
+    return tuple(note_to_pitch_class(split_octave(note)[0]) for note in tuning.split('-'))
+
+
+def open_string_pitches(tuning):
+    """'E-A-D-G-B-E' -> MIDI note numbers of the open strings, lowest (6th) string first.
+
+    A note without an octave is the nearest one above the string before it. Re-entrant tunings give
+    the octave of every string ('G4-C4-E4-A4'); the ukulele's G-C-E-A is read that way.
+    """
+    pitches = []
+    for note in REENTRANT_TUNINGS.get(tuning, tuning).split('-'):
+        name, octave = split_octave(note)
+        pitch_class = note_to_pitch_class(name)
+        if octave is not None:
+            pitches.append(12 * (octave + 1) + pitch_class)
+        elif pitches:
+            pitches.append(pitches[-1] + 1 + (pitch_class - pitches[-1] - 1) % 12)
+        else:
+            pitches.append(36 + pitch_class)
+    return tuple(pitches)
+
+
+def parse_chord(chord_name):
+    """'F#m7b5' -> (root, quality, bass) pitch classes and quality name"""
+    match = CHORD_RE.match(chord_name.strip())
+    if not match:
+        raise ValueError(f'Unknown chord "{chord_name}"')
+    root_letter, accidental, quality, bass = match.groups()
+    quality = QUALITY_ALIASES.get(quality, quality)
+    if quality not in QUALITIES:
+        raise ValueError(f'Unknown chord quality "{quality}" in "{chord_name}"')
+    root = note_to_pitch_class(root_letter + accidental)
+    return root, quality, note_to_pitch_class(bass) if bass else root
+
+
+def chord_masks(root, quality):
+    """Bit masks of the allowed and of the required pitch classes, the fifth is optional in 4+ note chords"""
+    intervals = QUALITIES[quality]
+    allowed = required = 0
+    for interval in intervals:
+        bit = 1 << ((root + interval) % 12)
+        allowed |= bit
+        if not (interval == 7 and len(intervals) >= 4):
+            required |= bit
+    return allowed, required
+
+
+def fingers_needed(frets):
+    """Fingers for each shape, a barre of finger 1 counts once: frets (rows, strings) -> (rows,)"""
+    fretted = frets > 0
+    lowest = np.where(fretted, frets, np.iinfo(frets.dtype).max).min(axis=1)
+    at_lowest = fretted & (frets == lowest[:, None])
+    n_strings = frets.shape[1]
+    index = np.arange(n_strings)
+    first = np.where(at_lowest, index, n_strings).min(axis=1)
+    last = np.where(at_lowest, index, -1).max(axis=1)
+    spanned = (index >= first[:, None]) & (index <= last[:, None])
+    # A barre needs two strings on the lowest fret and no open string under the finger
+    barre = (at_lowest.sum(axis=1) >= 2) & ~(spanned & (frets == 0)).any(axis=1)
+    return np.where(barre, 1 + (fretted & ~at_lowest).sum(axis=1), fretted.sum(axis=1)), barre
+
+
+def window_shapes(open_strings, start, max_stretch, max_fingers, min_strings, allow_inner_mutes):
+    """Shapes using fret `start` and no fret past start + max_stretch - 1: frets, pitch class bits, fingers, barre.
+
+    Built one string at a time; partial shapes that need too many fingers, mute too many strings or sound
+    more pitch classes than a chord has are dropped before the next string is added. Finger 1 bars the
+    strings on the first fret unless an open string lies between two of them, as in fingers_needed().
+    """
+    n_strings = len(open_strings)
+    choices = np.array([MUTED, 0] + list(range(start, start + max_stretch)), dtype=np.int16)
+    frets = np.zeros((1, 0), dtype=np.int16)
+    bits = np.zeros(1, dtype=np.int16)
+    # Strings on the first fret and above it, muted strings
+    on_first, above, muted = (np.zeros(1, dtype=np.int8) for _ in range(3))
+    # A string sounded then a muted one; an open string after one on the first fret; a barre is not possible
+    closed, gap, unbarred = (np.zeros(1, dtype=bool) for _ in range(3))
+    started = closed
+    for open_string in open_strings:
+        choice_bits = np.where(choices == MUTED, 0, 1 << ((open_string + np.maximum(choices, 0)) % 12))
+        rows = np.repeat(np.arange(len(frets)), len(choices))
+        new = np.tile(choices, len(frets))
+        sounding = new != MUTED
+        frets = np.concatenate([frets[rows], new[:, None]], axis=1)
+        bits = bits[rows] | np.tile(choice_bits, len(bits)).astype(np.int16)
+        inner_mute = closed[rows] & sounding
+        closed = closed[rows] | (started[rows] & ~sounding)
+        started = started[rows] | sounding
+        muted = muted[rows] + ~sounding
+        unbarred = unbarred[rows] | (gap[rows] & (new == start))
+        gap = gap[rows] | ((on_first[rows] > 0) & (new == 0))
+        on_first = on_first[rows] + (new == start)
+        above = above[rows] + (new > start)
+        # Every shape but the open one ends up with a finger on the first fret
+        fingers = above + np.where(unbarred, on_first, (on_first > 0) | (above > 0))
+        keep = (POPCOUNT[bits] <= MAX_CHORD_NOTES) & (fingers <= max_fingers) & (muted <= n_strings - min_strings)
+        if not allow_inner_mutes:
+            keep &= ~inner_mute
+        frets, bits, on_first, above, muted, closed, gap, unbarred, started = (
+            array[keep] for array in (frets, bits, on_first, above, muted, closed, gap, unbarred, started))
+    barre = (on_first >= 2) & ~unbarred
+    fingers = np.where(barre, 1 + above, on_first + above)
+    # A shape is listed in one window only: the one starting at its lowest fret, open shapes in the first
+    keep = (on_first > 0) | ((above == 0) & (start == 1))
+    return frets[keep], bits[keep], fingers[keep], barre[keep]
+
+
+class Fretboard:
+    """Playable shapes of one tuning with the pitch content of each shape.
+
+    frets: (shapes, strings) absolute frets, MUTED for muted strings, 6th string first
+    bits: pitch classes sounding in each shape as a 12 bit mask
+    bass: pitch class of the lowest sounding note, which is not always on the lowest string
+    first_position: shapes played without moving the hand up the neck
+    """
+
+    def __init__(self, tuning='E-A-D-G-B-E', max_fret=12, max_stretch=4, max_fingers=4, min_strings=None,
+                 allow_inner_mutes=False):
+        open_strings = np.array(parse_tuning(tuning), dtype=np.int16)
+        n_strings = len(open_strings)
+        if min_strings is None:
+            min_strings = max(3, n_strings - 2)
+        windows = [window_shapes(open_strings, start, max_stretch, max_fingers, min_strings, allow_inner_mutes)
+                   for start in range(1, max(max_fret - max_stretch + 2, 2))]
+        self.tuning = tuning
+        self.frets, self.bits, self.fingers, self.barre = (np.concatenate(arrays) for arrays in zip(*windows))
+        sounding = self.frets != MUTED
+        pitch_classes = (open_strings + np.where(sounding, self.frets, 0)) % 12
+        pitches = np.where(sounding, np.array(open_string_pitches(tuning), dtype=np.int16) + self.frets,
+                           np.iinfo(np.int16).max)
+        self.bass = pitch_classes[np.arange(len(self.frets)), pitches.argmin(axis=1)]
+        self.sounding = sounding.sum(axis=1)
+        fretted = np.where(self.frets > 0, self.frets, np.iinfo(np.int16).max)
+        self.position = np.where(self.frets.max(axis=1) > 0, fretted.min(axis=1), 0)
+        self.first_position = self.frets.max(axis=1) <= max_stretch
+
+    def find(self, chord_name, root_in_bass=True):
+        """Shapes playing exactly the notes of the chord, best first.
+
+        Shapes in the first position (no fret past the stretch of the hand) come before the others; then
+        most sounding strings, lowest position and fewest fingers.
+        """
+        root, quality, bass = parse_chord(chord_name)
+        allowed, required = chord_masks(root, quality)
+        match = ((self.bits & ~allowed) == 0) & ((self.bits & required) == required)
+        if root_in_bass:
+            match &= self.bass == bass
+        found = np.flatnonzero(match)
+        order = np.lexsort((self.fingers[found], self.position[found], -self.sounding[found],
+                            ~self.first_position[found]))
+        return self.frets[found[order]]
+
+
+@functools.lru_cache(maxsize=8)
+def fretboard(tuning='E-A-D-G-B-E', max_fret=12, max_stretch=4, max_fingers=4):
+    return Fretboard(tuning, max_fret, max_stretch, max_fingers)
+
+
+def find_voicings(chord_name, tuning='E-A-D-G-B-E', max_fret=12, max_stretch=4, max_fingers=4, root_in_bass=True):
+    """Absolute frets of every playable voicing, (voicings, strings), MUTED for muted strings"""
+    return fretboard(tuning, max_fret, max_stretch, max_fingers).find(chord_name, root_in_bass)
+
+
+def voicing_fingers(frets):
+    """Left hand fingers for one voicing: finger 1 bars the lowest fret when it can, then by fret and string"""
+    frets = [int(f) for f in frets]
+    fretted = [(f, s) for s, f in enumerate(frets) if f > 0]
+    fingers = [None] * len(frets)
+    if not fretted:
+        return fingers
+    lowest = min(f for f, _ in fretted)
+    _, barre = fingers_needed(np.array([frets]))
+    finger = 1
+    if barre[0]:
+        for f, s in fretted:
+            if f == lowest:
+                fingers[s] = 1
+        finger = 2
+    for f, s in sorted(fretted):
+        if fingers[s] is None:
+            fingers[s] = finger
+            finger += 1
+    return fingers
+
+
+def voicing_to_spec(chord_name, frets, n_frets=DEFAULT_OPTIONS['nFrets'], instrument=GUITAR.name):
+    """A chords file entry for one voicing, moved up the neck with firstFret when it does not fit the grid"""
+    frets = [int(f) for f in frets]
+    highest = max(frets)
+    first_fret = 1
+    if highest > n_frets:
+        first_fret = min(f for f in frets if f > 0)
+    fingers = voicing_fingers(frets)
+    shown = ['x' if f == MUTED else str(f if f == 0 else f - first_fret + 1) for f in frets]
+    return {
+        'instrument': instrument,
+        'header': chord_name,
+        'frets': '-'.join(shown),
+        'fingers': '-'.join('x' if f is None else str(f) for f in fingers),
+        'firstFret': first_fret,
+        'nFrets': n_frets,
+    }
+
+
+def chord_voicing_specs(chord_name, tuning='', limit=None, instrument=GUITAR.name, **kwargs):
+    """Chords file entries for the voicings, tuning defaults to the instrument's"""
+    tuning = tuning or get_instrument(instrument).tuning
+    return [voicing_to_spec(chord_name, frets, instrument=instrument)
+            for frets in find_voicings(chord_name, tuning, **kwargs)[:limit]]
+
+
+def create_parser(args):
+    parser = argparse.ArgumentParser(description='Write playable voicings of chords as a chords file.')
+    parser.add_argument('chords', nargs='+', help='chord symbols, e.g. C F#m7b5 Bb7/D')
+    parser.add_argument('--instrument', default=GUITAR.name)
+    parser.add_argument('--tuning', default='', help="default: the instrument's tuning")
+    parser.add_argument('--max-fret', type=int, default=12)
+    parser.add_argument('--max-stretch', type=int, default=4, help='frets covered by the hand')
+    parser.add_argument('--max-fingers', type=int, default=4)
+    parser.add_argument('--any-bass', action='store_true', help='do not require the root in the bass')
+    parser.add_argument('--limit', type=int, default=None, help='voicings per chord')
+    parser.add_argument('-o', '--output', default='-')
+    return parser.parse_args(args)
+
+
+def main(args):
+    name_space = create_parser(args)
+    specs = []
+    for chord_name in name_space.chords:
+        specs.extend(chord_voicing_specs(chord_name, name_space.tuning, name_space.limit, name_space.instrument,
+                                         max_fret=name_space.max_fret, max_stretch=name_space.max_stretch,
+                                         max_fingers=name_space.max_fingers,
+                                         root_in_bass=not name_space.any_bass))
+    text = json.dumps(specs, indent=1)
+    if name_space.output == '-':
+        print(text)
+    else:
+        with open(name_space.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
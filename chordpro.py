@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+chordpro.py
+Chord diagrams for the chords used in ChordPro songs.
+
+    python3 chordpro.py songs/ more.cho --library chords.json --book chords.svg --columns 8
+    python3 chordpro.py song.cho -o chords.json
+
+Files, or directories of .cho/.chopro/.chordpro/.crd/.pro files, are read
+line by line. The distinct chords, in order of first use over all songs,
+are resolved to fingerings by a {define:} directive of the songs (or a
+{define-ukulele:} one for that instrument), then by a chords file used as a
+library (matched by header and instrument), then by the voicing search of
+chord_voicings.py for --instrument and --tuning. They are rendered in one
+pass.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import json
+import os
+import re
+import sys
+
+from chord_library import LIBRARY_SUFFIX, ChordLibrary
+from chord_render import GUITAR, chord_spec_to_options, get_instrument, load_chord_specs, write_chord_book
+
+CHORDPRO_SUFFIXES = ('.cho', '.chopro', '.chordpro', '.crd', '.pro')
+DIRECTIVE_RE = re.compile(r'\{\s*([\w-]+)\s*:?\s*(.*?)\s*\}')
+CHORD_RE = re.compile(r'\[([^\]]+)\]')
+DEFINE_DIRECTIVES = ('define', 'chord')
+DEFINE_KEYWORDS = ('base-fret', 'frets', 'fingers', 'keys', 'copy', 'copyall', 'display', 'format', 'diagram')
+MUTED_FRETS = ('x', 'X', 'N', '-1')
+NO_CHORDS = ('N.C.', 'N.C', 'NC', 'n.c.')
+
+
+def stderr_warn(message):
+    sys.stderr.write(message + '\n')
+
+
+def chordpro_files(path):
+    """path itself, or the ChordPro files under a directory in sorted order"""
+    if not os.path.isdir(path):
+        yield path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(CHORDPRO_SUFFIXES):
+                yield os.path.join(root, name)
+
+
+def parse_define(value):
+    """'Am base-fret 1 frets x 0 2 2 1 0 fingers 0 0 2 3 1 0' -> (name, chord spec or None)"""
+    tokens = value.split()
+    if not tokens:
+        raise ValueError('Chord definition without a name')
+    name, fields, keyword = tokens[0], {}, None
+    for token in tokens[1:]:
+        if token.lower() in DEFINE_KEYWORDS:
+            keyword = token.lower()
+            fields[keyword] = []
+        elif keyword is not None:
+            fields[keyword].append(token)
+    if not fields.get('frets'):
+        # {chord: Am} only shows a chord, {define: Am copy A} is not supported
+        return name, None
+    frets = ['x' if f in MUTED_FRETS else f for f in fields['frets']]
+    if not all(f == 'x' or f.isdigit() for f in frets):
+        raise ValueError(f'Invalid frets in "{value}"')
+    fingers = ['x' if f in MUTED_FRETS or f in ('0', '-') else f for f in fields.get('fingers', [])]
+    base_fret = fields.get('base-fret', ['1'])[0]
+    if not base_fret.isdigit():
+        raise ValueError(f'Invalid base-fret in "{value}"')
+    spec = {
+        'header': name,
+        'frets': '-'.join(frets),
+        'firstFret': int(base_fret),
+        'nFrets': max([4] + [int(f) for f in frets if f != 'x']),
+    }
+    if len(fingers) == len(frets):
+        spec['fingers'] = '-'.join(fingers)
+    return name, spec
+
+
+def chordpro_events(file_name, warn=stderr_warn, instrument=GUITAR.name):
+    """Streams ('chord', name, None) and ('define', name, spec) events of a song, in file order.
+
+    {define-<instrument>:} and {chord-<instrument>:} count for that instrument only, their definitions come
+    as ('instrument_define', name, spec) events.
+    """
+    with open(file_name, encoding='utf-8', errors='replace') as f:
+        for line_number, line in enumerate(f, 1):
+            if line.lstrip().startswith('#'):
+                continue
+            for directive, value in DIRECTIVE_RE.findall(line):
+                directive, _, selector = directive.lower().partition('-')
+                if directive not in DEFINE_DIRECTIVES or selector not in ('', instrument):
+                    continue
+                try:
+                    name, spec = parse_define(value)
+                except ValueError as error:
+                    warn(f'{file_name}:{line_number}: {error}')
+                    continue
+                if spec is not None:
+                    yield 'instrument_define' if selector else 'define', name, spec
+                if directive == 'chord':
+                    yield 'chord', name, None
+            for name in CHORD_RE.findall(DIRECTIVE_RE.sub('', line)):
+                name = name.strip()
+                # [*Riff] is an annotation
+                if name and not name.startswith('*') and name not in NO_CHORDS:
+                    yield 'chord', name, None
+
+
+def collect_chords(paths, warn=stderr_warn, instrument=GUITAR.name):
+    """One pass over the songs: distinct chord names in order of first use, {define:} specs by name.
+
+    The first definition of a chord wins, one for the instrument wins over one for every instrument.
+    """
+    names, defined, for_instrument = {}, {}, set()
+    for path in paths:
+        for file_name in chordpro_files(path):
+            for event, name, spec in chordpro_events(file_name, warn, instrument):
+                if event == 'chord':
+                    names.setdefault(name, None)
+                elif name not in for_instrument:
+                    if event == 'instrument_define':
+                        defined[name] = spec
+                        for_instrument.add(name)
+                    else:
+                        defined.setdefault(name, spec)
+    return list(names), defined
+
+
+def load_library(file_name):
+    """A chord library (.sgcl) or a chords file as a library: chord specs by (header, instrument)"""
+    if file_name.lower().endswith(LIBRARY_SUFFIX):
+        return ChordLibrary(file_name)
+    library = {}
+    for spec in load_chord_specs(file_name):
+        if spec.get('header'):
+            library.setdefault((spec['header'], spec.get('instrument') or GUITAR.name), spec)
+    return library
+
+
+def library_spec(library, name, instrument, warn=stderr_warn):
+    """The first voicing of the chord for instrument, warns when the library has it for other instruments only"""
+    if isinstance(library, ChordLibrary):
+        spec, known = library.get(name, instrument=instrument), name in library
+    else:
+        spec = library.get((name, instrument))
+        known = spec is not None or any(header == name for header, _ in library)
+    if spec is None and known:
+        warn(f'Chord "{name}" is not in the library for {instrument}, searching a voicing')
+    return spec
+
+
+def voicing_spec(name, instrument, tuning=''):
+    # numpy is only needed for chords that are neither defined nor in the library
+    from chord_voicings import chord_voicing_specs
+    for root_in_bass in (True, False):
+        specs = chord_voicing_specs(name, tuning, limit=1, instrument=instrument, root_in_bass=root_in_bass)
+        if specs:
+            return specs[0]
+    return None
+
+
+def resolve_chords(names, defined, library=None, instrument=GUITAR.name, warn=stderr_warn, tuning=''):
+    """Yields a chord spec for every name that can be resolved, warns about the others.
+
+    Library voicings are for the instrument's own tuning, they are not used with another tuning.
+    """
+    if tuning and tuning != get_instrument(instrument).tuning:
+        library = None
+    for name in names:
+        try:
+            spec = defined.get(name)
+            if spec is None and library is not None:
+                spec = library_spec(library, name, instrument, warn)
+            if spec is None:
+                spec = voicing_spec(name, instrument, tuning)
+            if spec is None:
+                warn(f'No fingering found for chord "{name}"')
+                continue
+            spec = {'instrument': instrument, **({'tuning': tuning} if tuning else {}), **spec, 'header': name}
+            chord_spec_to_options(spec)
+        except ValueError as error:
+            warn(f'Chord "{name}": {error}')
+            continue
+        yield spec
+
+
+def chordpro_chord_specs(paths, library=None, instrument=GUITAR.name, warn=stderr_warn, tuning=''):
+    names, defined = collect_chords(paths, warn, instrument)
+    return list(resolve_chords(names, defined, library, instrument, warn, tuning))
+
+
+def create_parser(args):
+    parser = argparse.ArgumentParser(description='Chord diagrams of the chords used in ChordPro songs.')
+    parser.add_argument('paths', nargs='+', help='ChordPro files or directories')
+    parser.add_argument('--library', help='chord library (.sgcl) or chords file to look chords up by header')
+    parser.add_argument('--instrument', default=GUITAR.name)
+    parser.add_argument('--tuning', default='', help="tuning of the searched voicings, default: the instrument's")
+    parser.add_argument('--book', help='write the diagrams into this SVG file')
+    parser.add_argument('--columns', type=int, default=8, help='chords per row of --book')
+    parser.add_argument('-o', '--output', default='-', help='chords file to write, default: stdout')
+    return parser.parse_args(args)
+
+
+def main(args):
+    name_space = create_parser(args)
+    library = load_library(name_space.library) if name_space.library else None
+    specs = chordpro_chord_specs(name_space.paths, library, name_space.instrument, tuning=name_space.tuning)
+    if name_space.book:
+        write_chord_book(specs, name_space.book, name_space.columns)
+        print(f'{len(specs)} chords written to {name_space.book}')
+        return
+    text = json.dumps(specs, indent=1)
+    if name_space.output == '-':
+        print(text)
+    else:
+        with open(name_space.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+golden_check.py
+Compares rendered chord diagrams with the golden SVG of a corpus of chord specs.
+
+    python3 golden_check.py
+    python3 golden_check.py --update
+
+golden/corpus.jsonl holds one chord spec and its SVG per line: open and
+barre shapes, muted and open strings, capo and no capo, firstFret above 1,
+tuning and comment labels, every instrument. Each spec is rendered again,
+as a string by render_chord and as an lxml tree by render_chord_element,
+and compared with the golden SVG element by element. Attribute order, the
+order of style properties, number formatting (46.0 and 46) and spaces and
+commas in path data do not count; anything else is reported and the exit
+status is 1. --update writes the corpus again from the current output,
+after a change of the drawing that is wanted.
+
+golden/corpus.jsonl was written from the output of the extension after its
+drawing moved to chord_render.py (commit 27845a0): it guards that output,
+not the one of the first version. golden/baseline.jsonl ties the two
+together: the diagrams of BASELINE_SPECS and of every guitar spec of the
+corpus drawn by the first version of the extension (commit dfd4cc9,
+written with --update-baseline from a checkout of it), compared after the
+corpus. Two changes of that version are intended and filtered out: a barre
+is drawn once, not once per inner string, and a tuning with too few notes
+gets no empty <text> elements. The first version draws no other instrument
+and fails on a chord without fingers while finger numbers are shown, those
+specs are only in the corpus.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from xml.etree import ElementTree
+
+from chord_render import PATH_TOKEN_RE, chord_spec_to_options, render_chord, render_chord_element
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'corpus.jsonl')
+# Diagrams drawn by the first version of the extension, before chord_render.py
+BASELINE_FILE = os.path.join(os.path.dirname(CORPUS_FILE), 'baseline.jsonl')
+BASELINE_COMMIT = 'dfd4cc9'
+# Relative difference of two numbers that is still the same number
+TOLERANCE = 1e-9
+CORPUS_SHAPES = (
+    {'header': 'C', 'frets': 'x32010', 'fingers': 'x32010'},
+    {'header': 'G', 'frets': '320003', 'fingers': '21xxx3'},
+    {'header': 'A', 'frets': 'x02220', 'fingers': 'xx123x'},
+    {'header': 'E', 'frets': '022100', 'fingers': 'x231xx'},
+    {'header': 'F', 'frets': '133211', 'fingers': '134211'},
+    {'header': 'Bm', 'frets': 'x24432', 'fingers': 'x13421'},
+    {'header': 'F#m7b5', 'frets': 'x-1-2-1-2-x', 'fingers': 'x-1-3-2-4-x'},
+    {'header': 'Dsus4', 'frets': 'xx0233', 'fingers': 'xxx134'},
+    {'header': 'B7', 'frets': 'x21202', 'fingers': 'x213x4'},
+    {'header': 'Muted', 'frets': 'xxxxxx'},
+    {'header': 'Open', 'frets': '000000'},
+    {'header': 'Cmaj9', 'frets': 'x-3-2-4-3-x', 'nFrets': 5},
+)
+CORPUS_LABELS = (
+    {},
+    {'tuningTrue': True, 'tuning': 'D-A-D-G-B-E'},
+    {'perStringCommentsTrue': True, 'perStringComments': 'R-5-R-3-5-R', 'leftFingerNumberTrue': False},
+    {'headerTrue': False, 'tuningTrue': True},
+)
+CORPUS_INSTRUMENTS = (
+    {'instrument': 'ukulele', 'frets': '0003', 'fingers': 'xxx3'},
+    {'instrument': 'ukulele', 'frets': '2010', 'fingers': '2x1x', 'tuningTrue': True},
+    {'instrument': 'baritone_ukulele', 'frets': '0232', 'fingers': 'x132'},
+    {'instrument': 'mandolin', 'frets': '0023', 'fingers': 'xx12'},
+    {'instrument': 'bass', 'frets': 'x355', 'fingers': 'x134'},
+    {'instrument': 'bass5', 'frets': 'x3553', 'fingers': 'x1341', 'perStringCommentsTrue': True,
+     'perStringComments': 'R-5-R-3-5'},
+    {'instrument': 'guitar7', 'frets': 'x-x-3-2-0-1-0', 'fingers': 'x-x-3-2-x-1-x'},
+    {'instrument': 'guitar8', 'frets': '1-1-3-3-2-1-1-1', 'fingers': '1-1-3-4-2-1-1-1'},
+)
+
+BASELINE_SPECS = (
+    {'header': 'C', 'frets': 'x32010', 'fingers': 'x32010'},
+    {'header': 'G', 'frets': '320003', 'fingers': '21xxx3', 'capoPos': '2'},
+    {'header': 'A', 'frets': 'x02220', 'fingers': 'xx123x', 'tuningTrue': True, 'tuning': 'D-A-D-G-B-E'},
+    {'header': 'E', 'frets': '022100', 'fingers': 'x231xx', 'firstFret': 5},
+    {'header': 'F', 'frets': '133211', 'fingers': '134211'},
+    {'header': 'F', 'frets': '133211', 'fingers': '134211', 'capoPos': '3', 'firstFret': 7},
+    {'header': 'Bm', 'frets': 'x24432', 'fingers': 'x13421', 'nFrets': 5},
+    {'header': 'Dsus4', 'frets': 'xx0233', 'fingers': 'xxx134', 'perStringCommentsTrue': True,
+     'perStringComments': 'R-5-R-3-5-R', 'leftFingerNumberTrue': False},
+    {'header': 'B7', 'frets': 'x21202', 'fingers': 'x213x4', 'capoPos': '2', 'firstFret': 5},
+    {'header': 'C', 'frets': 'x32010', 'fingers': 'x32010', 'tuningTrue': True, 'tuning': 'E-A-D'},
+    {'header': 'Open', 'frets': '000000', 'headerTrue': False, 'tuningTrue': True},
+    {'header': 'Muted', 'frets': 'xxxxxx', 'capoPos': '7'},
+)
+
+
+def corpus_specs():
+    """The chord specs of a new corpus: every shape with and without capo and firstFret, labels cycled"""
+    specs = []
+    for (shape, capo, first_fret), labels in zip(itertools.product(CORPUS_SHAPES, ('No', '2', '7'), (1, 5, 14)),
+                                                  itertools.cycle(CORPUS_LABELS)):
+        specs.append({**shape, 'capoPos': capo, 'firstFret': first_fret, **labels})
+        specs.append({**shape, 'capoPos': capo, 'firstFret': first_fret, 'nFrets': 5,
+                      **CORPUS_LABELS[(len(specs) + 1) % len(CORPUS_LABELS)]})
+    for instrument, capo, first_fret in itertools.product(CORPUS_INSTRUMENTS, ('No', '3'), (1, 9)):
+        specs.append({'header': instrument['instrument'], **instrument, 'capoPos': capo, 'firstFret': first_fret})
+    return specs
+
+
+def normalize_number(value):
+    number = float(value)
+    return 0.0 if number == 0 else number
+
+
+def normalize_attribute(name, value):
+    if name == 'd':
+        return tuple(token if token.isalpha() else normalize_number(token) for token in PATH_TOKEN_RE.findall(value))
+    if name == 'style':
+        return tuple(sorted(tuple(p.strip() for p in item.split(':', 1)) for item in value.split(';') if ':' in item))
+    try:
+        return normalize_number(value)
+    except ValueError:
+        return value.strip()
+
+
+def same_value(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return abs(a - b) <= TOLERANCE * max(1.0, abs(a), abs(b))
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return len(a) == len(b) and all(same_value(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def local_tag(tag):
+    return tag.rpartition('}')[2]
+
+
+def compare_elements(expected, actual, path='svg'):
+    """Differences of two ElementTree/lxml elements as strings, [] when they are the same"""
+    if local_tag(expected.tag) != local_tag(actual.tag):
+        return [f'{path}: <{local_tag(actual.tag)}> instead of <{local_tag(expected.tag)}>']
+    differences = []
+    expected_attrib = {local_tag(k): v for k, v in expected.attrib.items()}
+    actual_attrib = {local_tag(k): v for k, v in actual.attrib.items()}
+    for name in sorted(set(expected_attrib) | set(actual_attrib)):
+        if expected_attrib.get(name) == actual_attrib.get(name):
+            continue
+        if name not in actual_attrib:
+            differences.append(f'{path}: {name} missing')
+        elif name not in expected_attrib:
+            differences.append(f'{path}: {name}="{actual_attrib[name]}" added')
+        elif not same_value(normalize_attribute(name, expected_attrib[name]),
+                            normalize_attribute(name, actual_attrib[name])):
+            differences.append(f'{path}: {name}="{actual_attrib[name]}" instead of "{expected_attrib[name]}"')
+    if (expected.text or '').strip() != (actual.text or '').strip():
+        differences.append(f'{path}: text "{actual.text}" instead of "{expected.text}"')
+    if len(expected) != len(actual):
+        differences.append(f'{path}: {len(actual)} children instead of {len(expected)}')
+    for index, (expected_child, actual_child) in enumerate(zip(expected, actual)):
+        differences += compare_elements(expected_child, actual_child,
+                                        f'{path}/{local_tag(expected_child.tag)}[{index}]')
+    return differences
+
+
+def load_corpus(file_name=CORPUS_FILE):
+    with open(file_name, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_corpus(specs, file_name=CORPUS_FILE):
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name, 'w', encoding='utf-8') as f:
+        for spec in specs:
+            f.write(json.dumps({'spec': spec, 'svg': render_chord(spec)}, ensure_ascii=False) + '\n')
+    return len(specs)
+
+
+def check_corpus(corpus):
+    """(index, spec, differences) of every spec whose output differs from its golden SVG"""
+    failures = []
+    for index, entry in enumerate(corpus):
+        golden = ElementTree.fromstring(entry['svg'])
+        svg = render_chord(entry['spec'])
+        # Parsed and compared only when the text differs
+        differences = [] if svg == entry['svg'] else compare_elements(golden, ElementTree.fromstring(svg))
+        differences += [f'lxml {d}' for d in compare_elements(golden, render_chord_element(entry['spec']))]
+        if differences:
+            failures.append((index, entry['spec'], differences))
+    return failures
+
+
+def layer_children(document):
+    """The elements of the layer an extension drew into, in a <g>"""
+    group = ElementTree.Element('g')
+    group.extend(next(e for e in ElementTree.fromstring(document).iter() if e.get('id') == 'layer1'))
+    return group
+
+
+def lxml_layer_children(document):
+    """layer_children with the prefixes of the document, for writing"""
+    from lxml import etree
+    root = etree.fromstring(document)
+    group = etree.Element(f'{{{root.nsmap[None]}}}g', nsmap={None: root.nsmap[None]})
+    group.extend(root.xpath('//*[@id="layer1"]/*'))
+    return group
+
+
+def baseline_specs():
+    """The chord specs of the baseline: BASELINE_SPECS and the guitar specs of a new corpus"""
+    return list(BASELINE_SPECS) + [spec for spec in corpus_specs() if 'instrument' not in spec]
+
+
+def write_baseline(extension_dir, file_name=BASELINE_FILE):
+    """Writes the diagrams of baseline_specs() drawn by the svgGuitarChord.py in extension_dir.
+
+    Returns (written, skipped): the first version fails on some specs, such as a chord without fingers while
+    finger numbers are shown, those are left out.
+    """
+    import subprocess
+    from lxml import etree
+    from benchmark import BLANK_SVG, spec_to_args
+    written = skipped = 0
+    with tempfile.TemporaryDirectory() as directory:
+        document = os.path.join(directory, 'blank.svg')
+        with open(document, 'wb') as f:
+            f.write(BLANK_SVG)
+        with open(file_name, 'w', encoding='utf-8') as f:
+            for spec in baseline_specs():
+                process = subprocess.run([sys.executable, os.path.join(extension_dir, 'svgGuitarChord.py'),
+                                          *spec_to_args(spec), document], capture_output=True)
+                if process.returncode:
+                    skipped += 1
+                    continue
+                svg = etree.tostring(lxml_layer_children(process.stdout), encoding='unicode')
+                f.write(json.dumps({'spec': spec, 'svg': svg}, ensure_ascii=False) + '\n')
+                written += 1
+    return written, skipped
+
+
+def intended_changes(group):
+    """The baseline diagram without what was dropped on purpose: empty <text> and repeated elements.
+
+    The first version drew a barre once per inner string and a <text> for every missing note of a short tuning.
+    """
+    previous = None
+    for element in list(group):
+        key = element.tag, element.attrib, element.text
+        if (local_tag(element.tag) == 'text' and not (element.text or '').strip()) or key == previous:
+            group.remove(element)
+        previous = key
+    return group
+
+
+def check_baseline(baseline):
+    """(index, spec, differences) of the baseline diagrams the extension draws otherwise, except intended changes"""
+    from benchmark import run_effect, spec_to_args
+    failures = []
+    for index, entry in enumerate(baseline):
+        # The warning of the short tuning is expected
+        with contextlib.redirect_stderr(io.StringIO()):
+            drawn = layer_children(run_effect(spec_to_args(entry['spec']))[1])
+        group = ElementTree.Element('g')
+        group.extend(drawn[0])
+        differences = compare_elements(intended_changes(ElementTree.fromstring(entry['svg'])), group)
+        if differences:
+            failures.append((index, entry['spec'], differences))
+    return failures
+
+
+def print_failures(failures, max_differences):
+    for index, spec, differences in failures:
+        print(f'#{index} {json.dumps(spec)}')
+        for difference in differences[:max_differences]:
+            print(f'    {difference}')
+        if len(differences) > max_differences:
+            print(f'    ... {len(differences) - max_differences} more')
+
+
+def create_parser(args):
+    parser = argparse.ArgumentParser(description='Compare rendered chord diagrams with the golden corpus.')
+    parser.add_argument('--corpus', default=CORPUS_FILE)
+    parser.add_argument('--update', action='store_true',
+                        help='write the corpus from the current output (new specs when it does not exist)')
+    parser.add_argument('--max-differences', type=int, default=5, help='differences shown per spec')
+    parser.add_argument('--update-baseline', metavar='DIR',
+                        help=f'write {os.path.basename(BASELINE_FILE)} with the svgGuitarChord.py in DIR, '
+                             f'a checkout of {BASELINE_COMMIT}')
+    return parser.parse_args(args)
+
+
+def main(args):
+    name_space = create_parser(args)
+    if name_space.update_baseline:
+        written, skipped = write_baseline(name_space.update_baseline)
+        print(f'{written} baseline diagrams written to {BASELINE_FILE}, {skipped} the first version cannot draw')
+        return 0
+    if name_space.update:
+        specs = [entry['spec'] for entry in load_corpus(name_space.corpus)] \
+            if os.path.exists(name_space.corpus) else corpus_specs()
+        print(f'{write_corpus(specs, name_space.corpus)} golden diagrams written to {name_space.corpus}')
+        return 0
+    start = time.perf_counter()
+    corpus = load_corpus(name_space.corpus)
+    failures = check_corpus(corpus)
+    print_failures(failures, name_space.max_differences)
+    print(f'{len(corpus) - len(failures)}/{len(corpus)} diagrams match the golden SVG '
+          f'({time.perf_counter() - start:.2f} s)')
+    start = time.perf_counter()
+    baseline = load_corpus(BASELINE_FILE)
+    baseline_failures = check_baseline(baseline)
+    print_failures(baseline_failures, name_space.max_differences)
+    print(f'{len(baseline) - len(baseline_failures)}/{len(baseline)} diagrams match the first version '
+          f'({BASELINE_COMMIT}) ({time.perf_counter() - start:.2f} s)')
+    return 1 if failures or baseline_failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+load_test.py
+Load test of chord_server.py on this machine.
+
+    python3 load_test.py --spawn --workers 2 --requests 20000 --connections 50 --distinct 200
+    python3 load_test.py --url http://127.0.0.1:8080 --revalidate
+
+Connections are kept alive and send their requests one after another; the
+chords asked for are drawn from --distinct different voicings, so the first
+requests are rendered (and coalesced) and the rest come from the cache.
+--revalidate sends the ETag of the last response back as If-None-Match.
+Requests per second, latency percentiles, status codes and the counters of
+the server are printed. --spawn starts a server on a free port first.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+FRET_CHOICES = ('x', '0', '1', '2', '3', '4')
+
+
+def chord_queries(distinct, seed=0):
+    """distinct query strings of /chord.svg"""
+    rng = random.Random(seed)
+    queries = set()
+    while len(queries) < distinct:
+        frets = '-'.join(rng.choice(FRET_CHOICES) for _ in range(6))
+        query = {'frets': frets, 'header': f'Chord {len(queries)}'}
+        if rng.random() < 0.3:
+            query['capo'] = rng.randint(1, 5)
+        queries.add(urlencode(query))
+    return sorted(queries)
+
+
+async def read_response(reader):
+    """(status, headers, body) of one response"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers, body
+
+
+async def client(host, port, paths, revalidate, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    try:
+        for path in paths:
+            extra = f'If-None-Match: {etags[path]}\r\n' if revalidate and path in etags else ''
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n{extra}\r\n'.encode('latin-1'))
+            status, headers, _ = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            if 'etag' in headers:
+                etags[path] = headers['etag']
+    finally:
+        writer.close()
+
+
+async def fetch_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET /stats HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+    _, _, body = await read_response(reader)
+    writer.close()
+    return json.loads(body)
+
+
+async def load_test(host, port, n_requests, n_connections, distinct, revalidate, seed=0):
+    queries = chord_queries(distinct, seed)
+    rng = random.Random(seed)
+    paths = [f'/chord.svg?{rng.choice(queries)}' for _ in range(n_requests)]
+    latencies, statuses = [], collections.Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, paths[i::n_connections], revalidate, latencies, statuses)
+                           for i in range(n_connections)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed),
+        'latency_ms': {f'p{p}': round(1000 * latencies[min(len(latencies) - 1, len(latencies) * p // 100)], 2)
+                       for p in (50, 90, 99)},
+        'statuses': dict(statuses),
+        'server': await fetch_stats(host, port),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(port, workers):
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chord_server.py')
+    process = subprocess.Popen([sys.executable, server, '--port', str(port), '--workers', str(workers)],
+                               stdout=subprocess.PIPE, text=True)
+    # The server prints one line once it accepts connections
+    process.stdout.readline()
+    return process
+
+
+def create_parser(args):
+    parser = argparse.ArgumentParser(description='Load test of chord_server.py.')
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--spawn', action='store_true', help='start a server on a free port for the test')
+    parser.add_argument('--workers', type=int, default=None, help='drawing processes of the --spawn server')
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--distinct', type=int, default=200, help='different chords asked for')
+    parser.add_argument('--revalidate', action='store_true', help='send If-None-Match with the last ETag')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(args)
+
+
+def main(args):
+    name_space = create_parser(args)
+    process = None
+    if name_space.spawn:
+        host, port = '127.0.0.1', free_port()
+        workers = name_space.workers if name_space.workers is not None else os.cpu_count()
+        process = spawn_server(port, workers)
+    else:
+        url = urlsplit(name_space.url)
+        host, port = url.hostname, url.port or 80
+    try:
+        result = asyncio.run(load_test(host, port, name_space.requests, name_space.connections,
+                                       name_space.distinct, name_space.revalidate, name_space.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(json.dumps(result, indent=1))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+render_chords.py
+Writes one standalone SVG file per chord of JSON/CSV chords files, without Inkscape.
+
+    python3 render_chords.py chords.json more.csv -o svg/ --workers 8 --chunksize 32
+    python3 render_chords.py chords.json --book book.svg --columns 8
+    python3 render_chords.py chords.json -o png/ --png --scale 0.5
+
+The files are rendered by a pool of processes. Every file depends only on its
+chord spec, so the output is the same byte for byte as with --workers 1.
+--book writes all chords into one document instead, streamed chord by chord.
+--png writes PNG thumbnails drawn by chord_raster.py instead of SVG files.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+'''
+
+import argparse
+import csv
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from chord_render import load_chord_specs, render_chord, write_chord_book
+
+
+def file_name(index, spec, suffix='.svg'):
+    slug = re.sub(r'[^A-Za-z0-9#+-]+', '_', str(spec.get('header', ''))).strip('_') or 'chord'
+    return f'{index:05d}-{slug.replace("#", "sharp")}{suffix}'
+
+
+def render_to_file(job):
+    path, spec, png_scale, transparent = job
+    if png_scale is not None:
+        # numpy is only needed for PNG files
+        from chord_raster import render_png
+        data = render_png(spec, png_scale, transparent)
+    else:
+        data = render_chord(spec).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def render_files(specs, output_dir, workers=None, chunksize=16, png_scale=None, transparent=False):
+    """Renders specs to output_dir/<index>-<header>.svg (.png with png_scale), returns the paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    suffix = '.png' if png_scale is not None else '.svg'
+    jobs = [(os.path.join(output_dir, file_name(index, spec, suffix)), spec, png_scale, transparent)
+            for index, spec in enumerate(specs)]
+    if workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            render_to_file(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # list() waits for the pool and raises the first error of a worker
+            list(executor.map(render_to_file, jobs, chunksize=max(chunksize, 1)))
+    return [job[0] for job in jobs]
+
+
+def create_parser(args):
+    parser = argparse.ArgumentParser(description='Render chord diagrams to one SVG file per chord.')
+    parser.add_argument('chords_files', nargs='+', help='JSON or CSV chords files')
+    parser.add_argument('-o', '--output-dir', default='.')
+    parser.add_argument('--workers', type=int, default=None, help='processes, default: number of CPUs')
+    parser.add_argument('--chunksize', type=int, default=16, help='chords sent to a process at once')
+    parser.add_argument('--book', help='write all chords into this one SVG file')
+    parser.add_argument('--columns', type=int, default=4, help='chords per row of --book')
+    parser.add_argument('--png', action='store_true', help='write PNG thumbnails instead of SVG files')
+    parser.add_argument('--scale', type=float, default=1.0, help='pixels per SVG user unit of --png')
+    parser.add_argument('--transparent', action='store_true', help='no white background behind --png')
+    name_space = parser.parse_args(args)
+    if name_space.png and name_space.scale <= 0:
+        parser.error('--scale must be greater than 0')
+    if name_space.workers is not None and name_space.workers < 1:
+        parser.error('--workers must be at least 1')
+    # Loaded here so that a bad chords file is reported as a usage error, not a traceback
+    name_space.specs = []
+    for chords_file in name_space.chords_files:
+        try:
+            name_space.specs.extend(load_chord_specs(chords_file))
+        except (OSError, ValueError, csv.Error) as error:
+            parser.error(f'{chords_file}: {error}')
+    return name_space
+
+
+def main(args):
+    name_space = create_parser(args)
+    specs = name_space.specs
+    if name_space.book:
+        write_chord_book(specs, name_space.book, name_space.columns)
+        print(f'{len(specs)} chords written to {name_space.book}')
+        return
+    paths = render_files(specs, name_space.output_dir, name_space.workers, name_space.chunksize,
+                         name_space.scale if name_space.png else None, name_space.transparent)
+    print(f'{len(paths)} files written to {name_space.output_dir}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
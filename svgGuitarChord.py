@@ -23,166 +23,52 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 __version__ = "1.0"
 
+import argparse
+import cProfile
+import time
+
+_import_start = time.perf_counter()
 import inkex
+INKEX_IMPORT_SECONDS = time.perf_counter() - _import_start
 from lxml import etree
 
-FINGERBOARD_WIDTH = 90
-FRET_WIDTH = 32
-GAP_STRINGS = 18
-
-
-def frets_path(coordinates, lenth_in_frets):
-    path = f'M {str(coordinates[0])} , {str(coordinates[1])} h {FINGERBOARD_WIDTH}'
-    for s in range(lenth_in_frets):
-        path += f'm -{FINGERBOARD_WIDTH},{FRET_WIDTH} h {FINGERBOARD_WIDTH}'
-    return path
-
-
-def strings_path(coordinates, length_in_frets):
-    string_length = length_in_frets * FRET_WIDTH
-    path = f'M {str(coordinates[0])}, {str(coordinates[1])} v {string_length} '
-    for i in range(5):
-        path += f'm {GAP_STRINGS},-{string_length} v {string_length} '
-    return path
-
-
-def create_grid(length_in_frets, coordinates):
-    style = {
-        'color': '#000000',
-        'fill': 'none',
-        'stroke': '#000000',
-        'stroke-width': '1.6',
-        'stroke-linecap': 'round',
-    }
-    path = f'{frets_path(coordinates, length_in_frets)} {strings_path(coordinates, length_in_frets)}'
-    return {
-        'd': path,
-        'style': str(inkex.Style(style)),
-    }
-
-
-def create_nut(coordinates):
-    style = {
-        'color': '#a85632',
-        'fill': 'none',
-        'stroke': '#a85632',
-        'stroke-width': '3.2',
-        'stroke-linecap': 'round',
-    }
-    path = f'M {str(coordinates[0])}, {str(coordinates[1])} h {FINGERBOARD_WIDTH} '
-    return {'d': path, 'style': str(inkex.Style(style))}
-
-
-def create_header(coordinates):
-    textstyle = {'font-size': '18',
-                 'font-family': 'Libertinus Serif',
-                 'text-anchor': 'middle',
-                 'fill': '#000000'}
-    return {'style': str(inkex.Style(textstyle)),
-            'x': str(coordinates[0]), 'y': str(coordinates[1])}
-
-
-def create_tuning_labels(coor):
-    textstyle = {'font-size': '8',
-                 'font-family': 'Libertinus Serif',
-                 'text-anchor': 'middle',
-                 'fill': '#000000'}
-    tu = []
-    for n in range(6):
-        tu.append({'style': str(inkex.Style(textstyle)),
-                   'x': str(coor[n][0]), 'y': str(coor[n][1])})
-    return tu
-
-
-def create_per_string_comments(coordinates, length_in_frets):
-    textstyle = {'font-size': '10',
-                 'font-family': 'Libertinus Serif',
-                 'text-anchor': 'middle',
-                 'fill': '#000000'}
-    y_coordinate_comment = length_in_frets * FRET_WIDTH + 15
-    comments_coordinates = []
-    for i in range(6):
-        comments_coordinates.append(
-            {
-                'style': str(inkex.Style(textstyle)),
-                'x': str(coordinates[0] + GAP_STRINGS * i),
-                'y': str(coordinates[1] + y_coordinate_comment),
-            }
-        )
-    return comments_coordinates
-
-
-def create_first_fret_label(coor):
-    textstyle = {'font-size': '12', 'font-family': 'Latin Modern Roman',
-                 'font-weight': 'bold', 'text-anchor': 'end', 'fill': '#434bf0'}
-    return {'style': str(inkex.Style(textstyle)),
-            'x': str(coor[0] - 7), 'y': str(coor[1] + FRET_WIDTH / 2)}
-
-
-def fret_to_text(fret_number):
-    romans = ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X',
-              'XI', 'XII', 'XIII', 'XIV', 'XV', 'XVI']
-    return romans[fret_number - 1]
-
-
-def create_capo_path(coordinates, upper_lef_corner_grid):
-    style = {'color': '#000000', 'fill': 'none', 'stroke': '#000000',
-             'stroke-width': '1.6', 'stroke-linecap': 'round'}
-    length_string = upper_lef_corner_grid[1] - coordinates[1]
-    path = f'M {str(coordinates[0])} , {str(coordinates[1])} v {length_string} m {GAP_STRINGS},-{length_string} v {length_string} m {GAP_STRINGS},-{length_string} v {length_string} m {GAP_STRINGS},-{length_string} v {length_string} m {GAP_STRINGS},-{length_string} v {length_string} m {GAP_STRINGS},-{length_string} v {length_string}'
-    return {'d': path, 'style': str(inkex.Style(style))}
-
-
-def create_capo_label(coor):
-    textstyle = {'font-size': '8', 'font-family': 'Latin Modern Roman',
-                 'font-weight': 'bold', 'text-anchor': 'end', 'fill': '#000000'}
-    return {'style': str(inkex.Style(textstyle)),
-            'x': str(coor[0] - 5), 'y': str(coor[1] + 4)}
-
-
-def createXAt(coordinates):
-    style = {'color': '#000000', 'fill': 'none', 'stroke': '#000000',
-             'stroke-width': '1.1', 'stroke-linecap': 'round'}
-    path = 'M ' + str(coordinates[0]) + ',' + str(coordinates[1]) + ' m 4,4 ' \
-                                                                    'l -8,-8 M ' + str(coordinates[0]) + ',' + str(
-        coordinates[1]) + '' \
-                          'm -4,4 l 8,-8'
-    return {'d': path, 'style': str(inkex.Style(style))}
-
-
-def create0At(coor):
-    style = {'color': '#000000', 'fill': 'none', 'stroke': '#000000',
-             'stroke-width': '1.1', 'stroke-linecap': 'round'}
-    path = 'M ' + str(coor[0]) + ',' + str(coor[1]) + ' m -4,0 ' \
-                                                      'a 4,4 0 1, 0 8 0 a 4,4 0 1, 0 -8 0'
-    return {'d': path, 'style': str(inkex.Style(style))}
-
-
-def createStringPressedAt(coor):
-    style = {'color': '#000000', 'fill': '#000000'}
-    path = 'M ' + str(coor[0]) + ',' + str(coor[1]) + ' m -6,0 ' \
-                                                      'a 6,6 0 1, 0 12 0 a 6,6 0 1, 0 -12 0'
-    return {'d': path, 'style': str(inkex.Style(style))}
-
-
-def leftFingerNumberAt(coor):
-    textstyle = {'font-size': '8', 'font-family': 'Latin Modern Roman',
-                 'font-weight': 'bold', 'text-anchor': 'start', 'fill': '#000000'}
-    return {'style': str(inkex.Style(textstyle)),
-            'x': str(coor[0]), 'y': str(coor[1])}
-
-
-def createBarreAt(coordinates_1, coordinates_2):
-    style = {'color': '#000000', 'fill': 'none', 'stroke': '#000000',
-             'stroke-width': '2', 'stroke-linecap': 'round'}
-    path = 'M ' + str(coordinates_1[0]) + ',' \
-           + str(coordinates_1[1]) + 'L' \
-           + str(coordinates_2[0]) + ',' \
-           + str(coordinates_2[1])
-    return {'d': path, 'style': str(inkex.Style(style))}
-
-
-class SVGGuitarChord(inkex.Effect):
+from chord_cache import ChordCache, chord_key
+from chord_library import ChordLibrary
+from chord_profile import RunProfile
+from chordpro import CHORDPRO_SUFFIXES, chordpro_chord_specs
+from chord_render import (
+    GROUP_TAG,
+    LAYER_ORIGIN,
+    STRING_ORDINALS,
+    SPEC_ATTRIBUTE,
+    STAGES_ATTRIBUTE,
+    USE_TAG,
+    XLINK_HREF,
+    XLINK_NS,
+    ChordGeometry,
+    ChordDiagram,
+    append_primitives,
+    attribute_to_options,
+    batch_cell_coordinates,
+    batch_cell_height,
+    batch_cell_width,
+    chord_spec_to_options,
+    coalesce_savings,
+    get_instrument,
+    insert_primitives,
+    load_chord_specs,
+    set_diagram_attributes,
+    stage_slices,
+    STYLESHEET_ID,
+    stylesheet_primitive,
+    symbol_definition,
+    symbol_ids,
+    symbol_savings,
+    uses_classes,
+)
+
+
+class SVGGuitarChord(ChordGeometry, inkex.Effect):
     def __init__(self):
         inkex.Effect.__init__(self)
         self.arg_parser.add_argument("--tab", type=str, dest="tab")
@@ -192,7 +78,8 @@ class SVGGuitarChord(inkex.Effect):
         self.arg_parser.add_argument("--firstFret", type=int, dest="firstFret", default=1)
         self.arg_parser.add_argument("--capoPos", type=str, default="No", dest="capoPos")
         self.arg_parser.add_argument("--tuningTrue", type=inkex.Boolean, default="False", dest="tuningTrue")
-        self.arg_parser.add_argument("--tuning", type=str, default='E-A-D-G-B-E', dest="tuning")
+        self.arg_parser.add_argument("--instrument", type=str, default='guitar', dest="instrument")
+        self.arg_parser.add_argument("--tuning", type=str, default='', dest="tuning")
         self.arg_parser.add_argument("--perStringCommentsTrue", type=inkex.Boolean, default="False",
                                      dest="perStringCommentsTrue")
         self.arg_parser.add_argument("--perStringComments", type=str, default='R-5-R-3-5-R', dest="perStringComments")
@@ -210,247 +97,333 @@ class SVGGuitarChord(inkex.Effect):
         self.arg_parser.add_argument("--fifthStringFinger", type=str, default='x', dest="fifthStringFinger")
         self.arg_parser.add_argument("--sixthStringFret", type=str, default='x', dest="sixthStringFret")
         self.arg_parser.add_argument("--sixthStringFinger", type=str, default='x', dest="sixthStringFinger")
-        self.upper_left_corner_grid = [30, 30]
+        self.arg_parser.add_argument("--seventhStringFret", type=str, default='x', dest="seventhStringFret")
+        self.arg_parser.add_argument("--seventhStringFinger", type=str, default='x', dest="seventhStringFinger")
+        self.arg_parser.add_argument("--eighthStringFret", type=str, default='x', dest="eighthStringFret")
+        self.arg_parser.add_argument("--eighthStringFinger", type=str, default='x', dest="eighthStringFinger")
+        self.arg_parser.add_argument("--chordName", type=str, default='', dest="chordName")
+        self.arg_parser.add_argument("--chordVoicing", type=int, default=1, dest="chordVoicing")
+        self.arg_parser.add_argument("--chordLibrary", type=str, default='', dest="chordLibrary")
+        self.arg_parser.add_argument("--chordsFile", type=str, default='', dest="chordsFile")
+        self.arg_parser.add_argument("--columns", type=int, default=4, dest="columns")
+        self.arg_parser.add_argument("--useSymbols", type=inkex.Boolean, default="False", dest="useSymbols")
+        self.arg_parser.add_argument("--useClasses", type=inkex.Boolean, default="False", dest="useClasses")
+        self.arg_parser.add_argument("--coalescePaths", type=inkex.Boolean, default="False", dest="coalescePaths")
+        self.arg_parser.add_argument("--reportSavings", type=inkex.Boolean, default="False", dest="reportSavings")
+        self.arg_parser.add_argument("--cacheDir", type=str, default='', dest="cacheDir")
+        self.arg_parser.add_argument("--cacheSize", type=int, default=64, dest="cacheSize", help="MiB")
+        self.arg_parser.add_argument("--profile", type=inkex.Boolean, default="False", dest="profile")
+        self.arg_parser.add_argument("--profileFile", type=str, default='', dest="profileFile",
+                                     help="JSON file for the timings, default: a summary in the messages")
+        self.arg_parser.add_argument("--profileStats", type=str, default='', dest="profileStats",
+                                     help="cProfile stats file")
+        self.upper_left_corner_grid = list(LAYER_ORIGIN)
+        self.rendered_diagrams = []
+        self.defined_ids = set()
+        self.warnings = 0
+        self.chord_cache = None
+        self.diagram_group = None
+        self.profile = RunProfile(enabled=False)
+        self.profiler = None
+
+    def load_raw(self):
+        self.profile = RunProfile(enabled=self.options.profile)
+        if self.options.profile:
+            self.profile.add_time(self.profile.phases, 'import_inkex', INKEX_IMPORT_SECONDS)
+            if self.options.profileStats:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+        with self.profile.phase('load'):
+            super().load_raw()
+
+    def save_raw(self, ret):
+        with self.profile.phase('save'):
+            super().save_raw(ret)
+        if self.options.profile:
+            self.report_profile()
+
+    def report_profile(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.options.profileStats)
+            self.profiler = None
+        if self.options.profileFile:
+            self.profile.write_json(self.options.profileFile)
+        else:
+            inkex.utils.debug(self.profile.summary())
+
+    def warn(self, message):
+        self.warnings += 1
+        inkex.utils.debug(message)
+
+    def append_to_diagram(self, primitives):
+        self.profile.count_elements(len(primitives))
+        self.add_primitive_definitions(primitives)
+        append_primitives(self.diagram_group, primitives)
+
+    def add_primitive_definitions(self, primitives):
+        if uses_classes(primitives):
+            self.add_definitions({STYLESHEET_ID})
+        self.add_definitions(symbol_ids(primitives))
+
+    def add_definitions(self, ids):
+        # Stylesheet and symbols are added to <defs> once per document
+        for definition_id in sorted(ids - self.defined_ids):
+            if self.svg.getElementById(definition_id) is None:
+                if definition_id == STYLESHEET_ID:
+                    definition = stylesheet_primitive()
+                else:
+                    definition = symbol_definition(definition_id)
+                append_primitives(self.svg.defs, [definition])
+                self.profile.count_elements(sum(1 for _ in self.svg.defs[-1].iter()))
+            self.defined_ids.add(definition_id)
+
+    def report_savings(self):
+        if self.options.coalescePaths:
+            self.report_coalescing()
+        inline_bytes, symbols_bytes = symbol_savings(self.rendered_diagrams)
+        saved = inline_bytes - symbols_bytes
+        percent = 100 * saved / inline_bytes if inline_bytes else 0
+        inkex.utils.debug(f'Inline: {inline_bytes} bytes, with symbols: {symbols_bytes} bytes, '
+                          f'saved {saved} bytes ({percent:.0f}%)')
+
+    def report_coalescing(self):
+        for diagram in self.rendered_diagrams:
+            (elements, n_bytes), (coalesced_elements, coalesced_bytes) = coalesce_savings(diagram)
+            inkex.utils.debug(f'{diagram.options.header}: {elements} -> {coalesced_elements} elements, '
+                              f'{n_bytes} -> {coalesced_bytes} bytes')
 
     def add_grid_to_svg_tree(self):
-        attribs_grid = create_grid(self.options.nFrets, self.upper_left_corner_grid)
-        etree.SubElement(
-            self.svg.get_current_layer(),
-            inkex.addNS('path', 'svg'),
-            attribs_grid,
-        )
+        self.append_to_diagram(self.stage_primitives('grid'))
 
     def add_nut_to_svg_tree(self):
-        if self.options.firstFret == 1 and self.options.capoPos == 'No':
-            attribs_nut = create_nut(self.upper_left_corner_grid)
-            etree.SubElement(
-                self.svg.get_current_layer(),
-                inkex.addNS('path', 'svg'),
-                attribs_nut,
-            )
+        self.append_to_diagram(self.stage_primitives('nut'))
 
     def add_first_fret_label_to_svg_tree(self):
-        is_visible = (
-                             self.options.firstFret != 1 and self.options.capoPos == 'No'
-                     ) or (
-                             self.options.firstFret > self.capoPos2 + 1 and self.options.capoPos != 'No'
-                     )
-        if is_visible:
-            attribs_firstFret = create_first_fret_label(self.upper_left_corner_grid)
-            textFirstFret = etree.SubElement(self.svg.get_current_layer(),
-                                             'text', attribs_firstFret)
-            textFirstFret.text = fret_to_text(self.options.firstFret)
+        self.append_to_diagram(self.stage_primitives('first_fret_label'))
 
     def add_capo_label_to_svg_tree(self):
-        if self.options.capoPos != 'No':
-            attribs_capoPos = create_capo_label(self.capo_upper_left_corner_coordinates)
-            textCapoPos = etree.SubElement(self.svg.get_current_layer(),
-                                           'text', attribs_capoPos)
-            textCapoPos.text = 'C ' + fret_to_text(self.capoPos2)
+        self.append_to_diagram(self.stage_primitives('capo_label'))
 
     def add_capo_path_to_svg_tree(self):
-        if self.options.capoPos != 'No' and not (self.options.firstFret > self.capoPos2 + 1):
-            attribs_capo1 = create_nut(self.capo_upper_left_corner_coordinates)
-            etree.SubElement(self.svg.get_current_layer(),
-                             inkex.addNS('path', 'svg'), attribs_capo1)
-            attribs_capo2 = create_capo_path(self.capo_upper_left_corner_coordinates, self.upper_left_corner_grid)
-            etree.SubElement(self.svg.get_current_layer(),
-                             inkex.addNS('path', 'svg'), attribs_capo2)
+        self.append_to_diagram(self.stage_primitives('capo_path'))
 
     def add_chord_label_to_svg_tree(self):
-        if self.options.headerTrue:
-            attribs_header = create_header(self.header_coordinates)
-            textHeader = etree.SubElement(self.svg.get_current_layer(),
-                                          'text', attribs_header)
-            textHeader.text = self.options.header
+        self.append_to_diagram(self.stage_primitives('chord_label'))
 
     def add_tuning_labels_to_svg_tree(self):
-        if self.options.tuningTrue:
-            attribs_tuning = create_tuning_labels(self.tuning_label_coordinates)
-            tuning = self.options.tuning.split('-')
-            try:
-                for n in range(6):
-                    textTuning = etree.SubElement(self.svg.get_current_layer(),
-                                                  'text', attribs_tuning[n])
-                    textTuning.text = tuning[n]
-            except IndexError:
-                inkex.debug("WARNING: Wrong tuning input.\nUse 5 hyphens to separate notes. Example: E-A-D-G-B-E")
+        self.append_to_diagram(self.stage_primitives('tuning_labels'))
 
     def add_string_comment_to_svg_tree(self):
-        if self.options.perStringCommentsTrue:
-            attribs_psComments = create_per_string_comments(self.upper_left_corner_grid, self.options.nFrets)
-            perStringComments = self.options.perStringComments.split('-')
-            try:
-                for n in range(6):
-                    textTuning = etree.SubElement(self.svg.get_current_layer(),
-                                                  'text', attribs_psComments[n])
-                    textTuning.text = perStringComments[n]
-            except IndexError:
-                inkex.debug(
-                    "WARNING: Wrong comments input.\nUse 5 hyphens as separators. A blank space leaves\na string without a comment. Example: R-5-R- - -5")
+        self.append_to_diagram(self.stage_primitives('string_comment'))
 
     def add_mute_string_label_to_svg_tree(self):
-        muted_strings = self.get_muted_strings()
-        for string_number in muted_strings:
-            attribs_x = createXAt(self.X0_label_coordinates(string_number))
-            etree.SubElement(self.svg.get_current_layer(),
-                             inkex.addNS('path', 'svg'), attribs_x)
+        self.append_to_diagram(self.stage_primitives('mute_string_label'))
 
     def add_open_string_label_to_svg_tree(self):
-        opened_strings = self.get_opened_strings()
-        for number in opened_strings:
-            attribs_o = create0At(self.X0_label_coordinates(number))
-            etree.SubElement(self.svg.get_current_layer(),
-                             inkex.addNS('path', 'svg'), attribs_o)
+        self.append_to_diagram(self.stage_primitives('open_string_label'))
 
     def add_pressed_fret_to_svg_tree(self):
-        nStringFret = self.get_pressed_frets_on_strings()
-        for ns, nf in nStringFret.items():
-            attribs_stringPressed = createStringPressedAt(self.get_pressed_fret_coordinates(ns, nf))
-            etree.SubElement(self.svg.get_current_layer(),
-                             inkex.addNS('path', 'svg'), attribs_stringPressed)
+        self.append_to_diagram(self.stage_primitives('pressed_fret'))
 
     def add_left_hand_finger_lables_to_svg_tree(self):
-        nStringFret = self.get_pressed_frets_on_strings()
-        fingers = self.get_used_fingers()
-        for string_number, fret_number in nStringFret.items():
-            if self.options.leftFingerNumberTrue:
-                attribs_leftFinger = leftFingerNumberAt(self.get_finger_label_coordinates(string_number, fret_number))
-                textLeftFinger = etree.SubElement(self.svg.get_current_layer(),
-                                                  'text', attribs_leftFinger)
-                textLeftFinger.text = str(fingers[string_number])
+        self.append_to_diagram(self.stage_primitives('left_hand_finger_lables'))
 
     def add_barre_to_svg_tree(self):
-        frets = self.get_pressed_frets_on_strings()
-        fingers = self.get_used_fingers()
-        in_position = True
-        if 1 in fingers.keys() and 6 in fingers.keys() and 1 in frets.keys() and 6 in frets.keys():
-            for i in range(2, 6):
-                try:
-                    in_position = in_position and (frets[i] >= frets[1] and frets[i] >= frets[6])
-                except TypeError:
-                    continue
-                except KeyError:
-                    continue
-                if fingers[1] == 1 and fingers[6] == 1 and frets[1] == frets[6] and in_position:
-                    string_one, string_sixth = self.get_barre_coordinates(frets)
-                    attribs_barre = createBarreAt(string_one, string_sixth)
-                    etree.SubElement(self.svg.get_current_layer(),
-                                     inkex.addNS('path', 'svg'), attribs_barre)
-
-    @property
-    def capo_upper_left_corner_coordinates(self):
-        #  Coordinates of capo, if applicable
-        ulc = list(self.upper_left_corner_grid)
-        # Corrected coordinates if there is a Capo
-        if self.options.capoPos != 'No' and not self.options.firstFret > self.capoPos2 + 1:
-            ulc[1] = self.upper_left_corner_grid[1] - 10
+        self.append_to_diagram(self.stage_primitives('barre'))
+
+    def chord_name_voicings(self):
+        name = self.options.chordName.strip()
+        tuning = self.options.tuning
+        # Library voicings are for the instrument's own tuning, as in chordpro.resolve_chords
+        if self.options.chordLibrary and tuning in ('', get_instrument(self.options.instrument).tuning):
+            library = self.open_chord_library()
+            try:
+                voicings, known = library.lookup(name, self.options.instrument), name in library
+            except (OSError, ValueError) as error:
+                raise inkex.AbortExtension(f'Cannot read chord library {self.options.chordLibrary}:\n{error}')
+            finally:
+                library.close()
+            if voicings:
+                return voicings
+            if known:
+                self.warn(f'Chord "{name}" is not in the library for {self.options.instrument}, searching a voicing')
+        # Without a library, or a chord it does not have, the voicing is searched, numpy comes with inkex
+        from chord_voicings import chord_voicing_specs
+        try:
+            return chord_voicing_specs(name, tuning, self.options.chordVoicing, self.options.instrument)
+        except ValueError as error:
+            raise inkex.AbortExtension(str(error))
+
+    def apply_chord_name(self):
+        """Replaces the per string options by the voicing of --chordName"""
+        voicings = self.chord_name_voicings()
+        if not 0 < self.options.chordVoicing <= len(voicings):
+            raise inkex.AbortExtension(f'Chord "{self.options.chordName}" has {len(voicings)} voicings '
+                                       f'for {self.options.instrument}, not {self.options.chordVoicing}')
+        for ordinal in STRING_ORDINALS:
+            setattr(self.options, f'{ordinal}StringFret', 'x')
+            setattr(self.options, f'{ordinal}StringFinger', 'x')
+        for name, value in chord_spec_to_options(voicings[self.options.chordVoicing - 1]).items():
+            setattr(self.options, name, value)
+
+    def open_chord_library(self):
+        try:
+            return ChordLibrary(self.options.chordLibrary)
+        except (OSError, ValueError) as error:
+            raise inkex.AbortExtension(f'Cannot read chord library {self.options.chordLibrary}:\n{error}')
+
+    def load_chords_file(self):
+        file_name = self.options.chordsFile
+        if file_name.lower().endswith(CHORDPRO_SUFFIXES):
+            # The chords used in a song, drawn once each, looked up in the chord library before the voicing search
+            library = self.open_chord_library() if self.options.chordLibrary else None
+            try:
+                specs = chordpro_chord_specs([file_name], library, self.options.instrument, self.warn,
+                                             self.options.tuning)
+            finally:
+                if library is not None:
+                    library.close()
+            return [chord_spec_to_options(spec) for spec in specs]
+        return load_chord_specs(file_name)
+
+    def add_chords_file_to_svg_tree(self):
+        try:
+            specs = self.load_chords_file()
+        except (OSError, ValueError) as error:
+            raise inkex.AbortExtension(f'Cannot read chords file {self.options.chordsFile}:\n{error}')
+        base_options = vars(self.options)
+        chord_options = [argparse.Namespace(**{**base_options, **spec}) for spec in specs]
+        try:
+            cell_width, cell_height = batch_cell_width(chord_options), batch_cell_height(chord_options)
+        except ValueError as error:
+            raise inkex.AbortExtension(str(error))
+        for index, options in enumerate(chord_options):
+            self.options = options
+            self.upper_left_corner_grid = batch_cell_coordinates(index, self.options.columns, cell_width, cell_height)
+            self.add_chord_to_svg_tree()
+        self.options = argparse.Namespace(**base_options)
+        self.upper_left_corner_grid = list(LAYER_ORIGIN)
+
+    def render_chord_group(self):
+        # Diagram drawn at LAYER_ORIGIN into a detached group, the form stored in the cache
+        origin = self.upper_left_corner_grid
+        self.upper_left_corner_grid = list(LAYER_ORIGIN)
+        self.diagram_group = group = etree.Element(GROUP_TAG)
+        counts = []
+        for stage in self.STAGES:
+            with self.profile.stage(stage):
+                n_children = len(group)
+                getattr(self, f'add_{stage}_to_svg_tree')()
+                counts.append(len(group) - n_children)
+        set_diagram_attributes(group, self.options, counts)
+        self.diagram_group = None
+        self.upper_left_corner_grid = origin
+        return group
+
+    def cached_chord_group(self):
+        if self.chord_cache is None:
+            self.chord_cache = ChordCache(self.options.cacheDir, self.options.cacheSize * 2 ** 20)
+        key = chord_key(self.options)
+        fragment = self.chord_cache.get(key)
+        if fragment is None:
+            warnings = self.warnings
+            group = self.render_chord_group()
+            if self.warnings == warnings:
+                self.chord_cache.put(key, etree.tostring(group))
+            return group
+        group = etree.fromstring(fragment, parser=inkex.elements.SVG_PARSER)
+        if self.options.useClasses:
+            self.add_definitions({STYLESHEET_ID})
+        self.add_definitions({use.get(XLINK_HREF)[1:] for use in group.iter(USE_TAG)})
+        # The group itself is not counted, as when the chord is drawn
+        self.profile.count_elements(sum(1 for _ in group.iter()) - 1)
+        return group
+
+    def add_chord_to_svg_tree(self):
+        self.profile.chords += 1
+        if self.options.reportSavings:
+            self.rendered_diagrams.append(ChordDiagram.from_options(self.options, self.upper_left_corner_grid))
+        if self.options.cacheDir:
+            with self.profile.stage('cached_chord'):
+                group = self.cached_chord_group()
         else:
-            ulc[1] = self.upper_left_corner_grid[1]
-        return ulc
-
-    @property
-    def header_coordinates(self):
-        if self.options.tuningTrue:
-            header_coordinates = (
-                self.capo_upper_left_corner_coordinates[0] + 45,
-                self.capo_upper_left_corner_coordinates[1] - 25,
-            )
+            group = self.render_chord_group()
+        dx = self.upper_left_corner_grid[0] - LAYER_ORIGIN[0]
+        dy = self.upper_left_corner_grid[1] - LAYER_ORIGIN[1]
+        if dx or dy:
+            group.attrib['transform'] = f'translate({dx},{dy})'
+        self.svg.get_current_layer().append(group)
+
+    def selected_diagrams(self):
+        groups = []
+        for element in self.svg.selection.values():
+            # A selected dot or label stands for its diagram
+            while element is not None and element.get(SPEC_ATTRIBUTE) is None:
+                element = element.getparent()
+            if element is not None and element not in groups:
+                groups.append(element)
+        return groups
+
+    def update_diagram(self, group):
+        """Rewrites the stages of a drawn diagram whose elements differ with the current options"""
+        self.profile.chords += 1
+        self.upper_left_corner_grid = list(LAYER_ORIGIN)
+        try:
+            old = ChordDiagram.from_options(attribute_to_options(group.get(SPEC_ATTRIBUTE)), LAYER_ORIGIN)
+            slices = stage_slices(group.get(STAGES_ATTRIBUTE), len(group))
+        except ValueError:
+            # Not written by this version or edited by hand: drawn again
+            for child in list(group):
+                group.remove(child)
+            old, slices = None, [(0, 0)] * len(self.STAGES)
         else:
-            header_coordinates = (
-                self.capo_upper_left_corner_coordinates[0] + 45,
-                self.capo_upper_left_corner_coordinates[1] - 15,
-            )
-        return header_coordinates
-
-    @property
-    def tuning_label_coordinates(self):
-        label_margin = 15
-        ct = []
-        for i in range(6):
-            ct.append(
-                [
-                    self.capo_upper_left_corner_coordinates[0] + i * GAP_STRINGS,
-                    self.capo_upper_left_corner_coordinates[1] - label_margin,
-                ]
-            )
-        return ct
-
-    @property
-    def strings_frets(self):
-        return {
-            1: self.options.firstStringFret,
-            2: self.options.secondStringFret,
-            3: self.options.thirdStringFret,
-            4: self.options.fourthStringFret,
-            5: self.options.fifthStringFret,
-            6: self.options.sixthStringFret,
-        }
-
-    @property
-    def strings_fingers(self):
-        return {
-            1: self.options.firstStringFinger,
-            2: self.options.secondStringFinger,
-            3: self.options.thirdStringFinger,
-            4: self.options.fourthStringFinger,
-            5: self.options.fifthStringFinger,
-            6: self.options.sixthStringFinger,
-        }
-
-    @property
-    def capoPos2(self):
-        return int(self.options.capoPos) if self.options.capoPos != 'No' else 0
-
-    def get_used_fingers(self):
-        return {sn: int(f) for sn, f in self.strings_fingers.items() if f.isdigit()}
-
-    def get_pressed_frets_on_strings(self):
-        return {sn: int(sf) for sn, sf in self.strings_frets.items() if sf.isdigit() and sf != '0'}
-
-    def get_muted_strings(self):
-        return [sn for sn, sf in self.strings_frets.items() if sf == 'x']
-
-    def get_opened_strings(self):
-        return [sn for sn, sf in self.strings_frets.items() if sf == '0']
-
-    def X0_label_coordinates(self, string_number):
-        margin = 7
-        x = self.capo_upper_left_corner_coordinates[0] + FINGERBOARD_WIDTH - (string_number - 1) * GAP_STRINGS
-        y = self.capo_upper_left_corner_coordinates[1] - margin
-        return [x, y]
-
-    def get_pressed_fret_coordinates(self, number_string, number_fret):
-        shift = 20
-        x = self.upper_left_corner_grid[0] + FINGERBOARD_WIDTH - (number_string - 1) * GAP_STRINGS
-        y = self.upper_left_corner_grid[1] + shift + (number_fret - 1) * FRET_WIDTH
-        return [x, y]
-
-    def get_finger_label_coordinates(self, number_string, number_finger):
-        shift = 25
-        x = self.upper_left_corner_grid[0] + FINGERBOARD_WIDTH - (number_string - 1) * GAP_STRINGS + 7
-        y = self.upper_left_corner_grid[1] + shift + (number_finger - 1) * FRET_WIDTH + 5
-        return [x, y]
-
-    def get_barre_coordinates(self, strings_frets: dict):
-        string_one_coordinates = self.get_pressed_fret_coordinates(1, strings_frets[1])
-        string_sixth_coordinates = self.get_pressed_fret_coordinates(6, strings_frets[6])
-        return string_one_coordinates, string_sixth_coordinates
+            old.warn = lambda message: None
+        counts = []
+        shift = 0
+        for stage, (start, end) in zip(self.STAGES, slices):
+            with self.profile.stage(stage):
+                primitives = self.stage_primitives(stage)
+                if old is None or primitives != old.stage_primitives(stage):
+                    # Children of the stages already rewritten moved by shift
+                    for child in group[start + shift:end + shift]:
+                        group.remove(child)
+                    self.add_primitive_definitions(primitives)
+                    insert_primitives(group, start + shift, primitives)
+                    self.profile.count_elements(len(primitives))
+                    shift += len(primitives) - (end - start)
+                counts.append(len(primitives))
+        set_diagram_attributes(group, self.options, counts)
 
     def effect(self):
-        self.add_grid_to_svg_tree()
-        self.add_nut_to_svg_tree()
-        self.add_first_fret_label_to_svg_tree()
-        self.add_capo_label_to_svg_tree()
-        self.add_capo_path_to_svg_tree()
-        self.add_chord_label_to_svg_tree()
-        self.add_tuning_labels_to_svg_tree()
-        self.add_string_comment_to_svg_tree()
-        self.add_mute_string_label_to_svg_tree()
-        self.add_open_string_label_to_svg_tree()
-        self.add_pressed_fret_to_svg_tree()
-        self.add_left_hand_finger_lables_to_svg_tree()
-        self.add_barre_to_svg_tree()
+        try:
+            get_instrument(self.options.instrument)
+        except ValueError as error:
+            raise inkex.AbortExtension(str(error))
+        with self.profile.phase('effect'):
+            if self.options.chordsFile:
+                self.add_chords_file_to_svg_tree()
+            else:
+                if self.options.chordName.strip():
+                    self.apply_chord_name()
+                groups = self.selected_diagrams()
+                for group in groups:
+                    self.update_diagram(group)
+                if not groups:
+                    self.add_chord_to_svg_tree()
+            if self.options.useSymbols:
+                self.declare_xlink()
+        if self.options.reportSavings:
+            self.report_savings()
+
+    def declare_xlink(self):
+        """One xmlns:xlink on the root instead of one on every <use> of a document that had none"""
+        root = self.document.getroot()
+        if root.nsmap.get('xlink') == XLINK_NS:
+            return
+        prefixes = {prefix for element in root.iter() for prefix, uri in element.nsmap.items()
+                    if prefix and uri != XLINK_NS}
+        etree.cleanup_namespaces(root, top_nsmap={'xlink': XLINK_NS}, keep_ns_prefixes=sorted(prefixes))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,22 @@
+import argparse
+
+import chord_cache
+from chord_cache import ChordCache, chord_key
+from chord_render import DEFAULT_OPTIONS
+
+
+def test_key_follows_renderer(monkeypatch):
+    """Another version of chord_render.py gives other keys, fragments it drew are not reused"""
+    options = argparse.Namespace(**DEFAULT_OPTIONS)
+    key = chord_key(options)
+    monkeypatch.setattr(chord_cache, 'render_version', lambda: 'another renderer')
+    assert chord_key(options) != key
+
+
+def test_put_replaced_size(tmp_path):
+    """Storing a fragment again under the same key counts its size once"""
+    cache = ChordCache(str(tmp_path))
+    assert cache.size() == 0
+    cache.put('ab' * 32, b'<g>first</g>')
+    cache.put('ab' * 32, b'<g>second</g>')
+    assert cache.size() == len(b'<g>second</g>') == sum(size for _, size, _ in cache.entries())
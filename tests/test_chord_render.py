@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from chord_render import ChordDiagram, attrib_escape, escape, is_barre
+
+
+@pytest.mark.parametrize('frets, expected', [
+    ({1: 3, 2: 5, 3: 5, 4: 4, 5: 3, 6: 3}, True),
+    ({1: 3, 2: 3, 3: 3, 4: 2, 5: 3, 6: 3}, False),
+    ({1: 3, 2: 2, 3: 4, 4: 5, 5: 5, 6: 3}, False),
+])
+def test_barre_inner_strings(frets, expected):
+    """No barre when an inner string is pressed below the barre fret, wherever it is"""
+    assert is_barre(frets, {1: 1, 6: 1}) is expected
+
+
+def test_escape():
+    """Text and attribute values are escaped as xml.sax.saxutils.escape would"""
+    from xml.sax.saxutils import escape as sax_escape
+    value = 'a & b < c > d "e"\n\r\t&amp;'
+    assert escape(value) == sax_escape(value)
+    assert attrib_escape(value) == sax_escape(value, {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'})
+
+
+def test_import_without_urllib():
+    """Importing chord_render stays quick: no inkex, no urllib.request"""
+    code = 'import sys, chord_render; print(sorted({"inkex", "urllib.request"} & set(sys.modules)))'
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    assert output.strip() == '[]'
+
+
+@pytest.mark.parametrize('capo, first_fret, kinds', [
+    ('No', 1, set()),
+    ('0', 1, {'capo', 'capo_path', 'capo_label'}),
+    ('2', 1, {'capo', 'capo_path', 'capo_label'}),
+    ('2', 5, {'capo_label'}),
+])
+def test_capo_label(capo, first_fret, kinds):
+    """The capo label is drawn whenever a capo is set, as the capo itself, capo 0 included"""
+    diagram = ChordDiagram({'frets': 'x32010', 'capoPos': capo, 'firstFret': first_fret})
+    assert {p.kind for p in diagram.chord_primitives()} & {'capo', 'capo_path', 'capo_label'} == kinds
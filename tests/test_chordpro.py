@@ -0,0 +1,63 @@
+import json
+
+from chord_library import ChordLibrary, write_library
+from chord_render import chord_spec_to_options
+from chordpro import collect_chords, load_library, resolve_chords
+from svgGuitarChord import SVGGuitarChord
+
+C = {'header': 'C', 'frets': 'x32010', 'fingers': 'x32010', 'instrument': 'guitar'}
+
+
+def test_library_instrument(tmp_path):
+    """A guitar library does not give the shapes of a ukulele song"""
+    chords_file = tmp_path / 'guitar.json'
+    chords_file.write_text(json.dumps([C]), encoding='utf-8')
+    library_file = str(tmp_path / 'guitar.sgcl')
+    write_library([C], library_file)
+    for library in (load_library(str(chords_file)), ChordLibrary(library_file)):
+        warnings = []
+        specs = list(resolve_chords(['C'], {}, library, 'ukulele', warnings.append))
+        if isinstance(library, ChordLibrary):
+            library.close()
+        assert [(spec['instrument'], 'sixthStringFret' in chord_spec_to_options(spec)) for spec in specs] \
+            == [('ukulele', False)]
+        assert warnings
+
+
+def test_custom_tuning():
+    """A custom tuning reaches the voicing search"""
+    warnings = []
+    specs = list(resolve_chords(['D'], {}, tuning='D-A-D-G-B-E', warn=warnings.append))
+    assert specs and specs[0].get('tuning') == 'D-A-D-G-B-E', warnings
+
+
+SONG = """{title: Song}
+{define: Am base-fret 1 frets x 0 2 2 1 0}
+{define-ukulele: Am base-fret 1 frets 2 0 0 0}
+{define-mandolin: G base-fret 1 frets 0 0 2 3}
+[Am]Words [C]words [G]words
+"""
+
+
+def test_instrument_defines(tmp_path):
+    """{define-<instrument>:} counts for that instrument only and wins over {define:}"""
+    song = tmp_path / 'song.cho'
+    song.write_text(SONG, encoding='utf-8')
+    assert collect_chords([str(song)]) == (['Am', 'C', 'G'], {'Am': {
+        'header': 'Am', 'frets': 'x-0-2-2-1-0', 'firstFret': 1, 'nFrets': 4}})
+    _, defined = collect_chords([str(song)], instrument='ukulele')
+    assert {name: spec['frets'] for name, spec in defined.items()} == {'Am': '2-0-0-0'}
+    _, defined = collect_chords([str(song)], instrument='mandolin')
+    assert {name: spec['frets'] for name, spec in defined.items()} == {'Am': 'x-0-2-2-1-0', 'G': '0-0-2-3'}
+
+
+def test_extension_song_library(tmp_path):
+    """A song chosen as chords file of the extension looks its chords up in the chord library"""
+    song = tmp_path / 'song.cho'
+    song.write_text('[C]Words', encoding='utf-8')
+    library_file = str(tmp_path / 'chords.sgcl')
+    write_library([{**C, 'frets': 'x-3-5-5-5-3', 'fingers': 'x-1-2-3-4-1'}], library_file)
+    effect = SVGGuitarChord()
+    effect.parse_arguments([f'--chordsFile={song}', f'--chordLibrary={library_file}'])
+    specs = effect.load_chords_file()
+    assert [(spec['fifthStringFret'], spec['fourthStringFret']) for spec in specs] == [('3', '5')]
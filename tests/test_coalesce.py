@@ -0,0 +1,43 @@
+import pytest
+
+from chord_render import ChordDiagram, coalesce_savings, symbol_savings
+
+SPEC = {'header': 'C', 'frets': 'x32010', 'fingers': 'x32010'}
+
+
+@pytest.mark.parametrize('coalesce_paths', (False, True))
+def test_coalesce_savings_options(coalesce_paths):
+    """coalesce_savings measures both ways and leaves coalescePaths of the diagram as it was"""
+    diagram = ChordDiagram({**SPEC, 'coalescePaths': coalesce_paths})
+    (elements, _), (coalesced_elements, _) = coalesce_savings(diagram)
+    assert coalesced_elements < elements
+    assert diagram.options.coalescePaths == coalesce_paths
+
+
+@pytest.mark.parametrize('savings', (coalesce_savings, lambda diagram: symbol_savings([diagram])))
+def test_savings_keep_warnings(savings):
+    """The reports draw without warnings, the diagram warns again afterwards"""
+    diagram = ChordDiagram({**SPEC, 'perStringCommentsTrue': True, 'perStringComments': 'R-5'})
+    warnings = []
+    diagram.warn = warnings.append
+    savings(diagram)
+    assert warnings == []
+    list(diagram.chord_primitives())
+    assert warnings
+
+
+def test_symbol_savings_options():
+    """symbol_savings leaves useSymbols of the diagrams as it was, also when drawing fails"""
+    diagram = ChordDiagram({**SPEC, 'useSymbols': False})
+    symbol_savings([diagram])
+    assert diagram.options.useSymbols is False
+
+    def chord_primitives():
+        if diagram.options.useSymbols:
+            raise ValueError('cannot draw')
+        return []
+
+    diagram.chord_primitives = chord_primitives
+    with pytest.raises(ValueError):
+        symbol_savings([diagram])
+    assert diagram.options.useSymbols is False
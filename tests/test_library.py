@@ -0,0 +1,38 @@
+import pytest
+
+from chord_library import write_library
+from chord_voicings import chord_voicing_specs
+from svgGuitarChord import SVGGuitarChord
+
+LIBRARY_C = {'header': 'C', 'frets': 'x-3-5-5-5-3', 'fingers': 'x-1-2-3-4-1', 'instrument': 'guitar'}
+
+
+@pytest.fixture
+def library_file(tmp_path):
+    path = str(tmp_path / 'chords.sgcl')
+    write_library([LIBRARY_C], path)
+    return path
+
+
+def chord_name_voicings(library_file, *args):
+    effect = SVGGuitarChord()
+    effect.parse_arguments(['--chordName=C', f'--chordLibrary={library_file}', *args])
+    return effect.chord_name_voicings(), effect.warnings
+
+
+@pytest.mark.parametrize('tuning', ('', 'E-A-D-G-B-E'))
+def test_library_voicings(library_file, tuning):
+    voicings, _ = chord_name_voicings(library_file, f'--tuning={tuning}')
+    assert [voicing['frets'] for voicing in voicings] == [LIBRARY_C['frets']]
+
+
+def test_other_tuning_searched(library_file):
+    """Library voicings are for the instrument's tuning, in drop D the voicing is searched"""
+    voicings, _ = chord_name_voicings(library_file, '--tuning=D-A-D-G-B-E')
+    assert voicings == chord_voicing_specs('C', 'D-A-D-G-B-E', 1)
+
+
+def test_other_instrument_searched(library_file):
+    """A chord the library has for another instrument only is searched, with a warning"""
+    voicings, warnings = chord_name_voicings(library_file, '--instrument=ukulele')
+    assert voicings == chord_voicing_specs('C', limit=1, instrument='ukulele') and warnings == 1
@@ -0,0 +1,22 @@
+import io
+
+from benchmark import BLANK_SVG, spec_to_args
+from svgGuitarChord import SVGGuitarChord
+
+SPEC = {'header': 'C', 'frets': 'x32010', 'fingers': 'x32010'}
+
+
+def test_profile_stages(tmp_path):
+    """Profiled stages add up to no more than the run, a cached chord counts as many elements as a drawn one"""
+    elements = []
+    # Drawn, drawn and stored in the cache, read from the cache
+    for args in ([], [f'--cacheDir={tmp_path}'], [f'--cacheDir={tmp_path}']):
+        effect = SVGGuitarChord()
+        effect.parse_arguments(['--profile=True'] + spec_to_args(SPEC) + args)
+        effect.options.input_file = io.BytesIO(BLANK_SVG)
+        effect.load_raw()
+        effect.effect()
+        report = effect.profile.to_dict()
+        elements.append(report['total_elements'])
+        assert sum(report['stages_ms'].values()) <= report['phases_ms']['effect']
+    assert len(set(elements)) == 1, elements
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from render_chords import create_parser
+
+
+@pytest.fixture
+def chords_file(tmp_path):
+    path = tmp_path / 'chords.json'
+    path.write_text(json.dumps([{'header': 'C', 'frets': 'x32010'}]), encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('workers', ('0', '-2'))
+def test_workers_at_least_one(chords_file, workers, capsys):
+    with pytest.raises(SystemExit):
+        create_parser([chords_file, '--workers', workers])
+    assert '--workers must be at least 1' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('name, content', [
+    ('chords.json', b'{"header": "C"}'),
+    ('chords.json', b'[{'),
+    ('chords.csv', b'header,frets\nC\xe9,x32010\n'),
+    ('missing.json', None),
+])
+def test_bad_chords_file(tmp_path, name, content, capsys):
+    """A chords file that cannot be read is a usage error, not a traceback"""
+    path = tmp_path / name
+    if content is not None:
+        path.write_bytes(content)
+    with pytest.raises(SystemExit):
+        create_parser([str(path)])
+    assert f'{path}: ' in capsys.readouterr().err
+
+
+def test_specs_loaded(chords_file):
+    assert [spec['header'] for spec in create_parser([chords_file, chords_file, '--workers', '1']).specs] == ['C', 'C']
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+import pytest
+
+import chord_server
+from chord_server import ChordServer
+from load_test import free_port, read_response, spawn_server
+
+
+@pytest.fixture
+def server():
+    server = ChordServer(workers=0)
+    yield server
+    server.close()
+
+
+def child_processes(pid):
+    """Process ids whose parent is pid, from /proc"""
+    children = []
+    for name in os.listdir('/proc'):
+        try:
+            with open(f'/proc/{name}/stat', encoding='utf-8') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command in parentheses may contain spaces, the parent id is the second field after it
+        if int(stat.rpartition(')')[2].split()[1]) == pid:
+            children.append(int(name))
+    return children
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='needs /proc')
+def test_shutdown():
+    """chord_server.py ends its drawing processes when it is terminated"""
+    port = free_port()
+    process = spawn_server(port, 1)
+    try:
+        with urlopen(f'http://127.0.0.1:{port}/chord.svg?frets=x32010', timeout=10) as response:
+            response.read()
+        workers = child_processes(process.pid)
+    finally:
+        process.terminate()
+        process.wait(10)
+        process.stdout.close()
+    assert workers
+    assert not [pid for pid in workers if os.path.exists(f'/proc/{pid}')]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('frets=x32010&fingers=x32010&capo=2&header=C', 200),
+    ('instrument=ukulele&frets=0003', 200),
+    ('frets=x32010&nFrets=3000000', 400),
+    ('frets=x32010&nFrets=-3', 400),
+    ('frets=x32010&firstFret=0', 400),
+    ('frets=x32010&capo=-3', 400),
+    ('frets=x3201', 400),
+    ('instrument=ukulele&frets=x32010', 400),
+    ('frets=x32010&fingers=zzzzzz', 400),
+    ('frets=99-99-99-99-99-99', 400),
+])
+def test_queries(server, query, expected):
+    """chord_server.py answers 400 to queries a diagram cannot show instead of drawing them"""
+    assert asyncio.run(server.respond('GET', f'/chord.svg?{query}', {}))[0] == expected
+
+
+def test_request_body(server):
+    """The body of a request on a kept alive connection is not read as the next request"""
+    async def requests():
+        tcp_server = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*tcp_server.sockets[0].getsockname()[:2])
+        body = b'GET /missing HTTP/1.1\r\n\r\n'
+        writer.write(b'POST /chord.svg HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body) +
+                     b'GET /chord.svg?frets=x32010 HTTP/1.1\r\nConnection: close\r\n\r\n')
+        statuses = [(await read_response(reader))[0] for _ in range(2)]
+        # Until the server closes the connection after the request with Connection: close
+        await reader.read()
+        writer.close()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+        return statuses
+
+    assert asyncio.run(requests()) == [405, 200]
+
+
+def test_cancelled_render(monkeypatch):
+    """Requests waiting for a render end with it when it is cancelled instead of waiting forever"""
+    drawing = threading.Event()
+    monkeypatch.setattr(chord_server, 'render_job', lambda *job: drawing.wait(10) and b'<svg/>')
+    server = ChordServer(workers=0)
+    server.executor = ThreadPoolExecutor(1)
+
+    async def requests():
+        first = asyncio.ensure_future(server.render('/chord.svg', 'frets=x32010'))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.ensure_future(server.render('/chord.svg', 'frets=x32010'))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.wait([first, waiting], timeout=5)
+        # Before asyncio.run() cancels what is left
+        return first.cancelled(), waiting.done(), dict(server.pending)
+
+    try:
+        assert asyncio.run(requests()) == (True, True, {})
+    finally:
+        drawing.set()
+        server.close()
+
+
+def test_idle_timeout():
+    """A kept alive connection without a next request is closed after the idle timeout"""
+    server = ChordServer(workers=0, idle_timeout=0.1)
+
+    async def idle():
+        tcp_server = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*tcp_server.sockets[0].getsockname()[:2])
+        writer.write(b'GET /chord.svg?frets=x32010 HTTP/1.1\r\n\r\n')
+        status = (await read_response(reader))[0]
+        # Closed by the server: read() returns at the end of the stream
+        rest = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+        return status, rest
+
+    try:
+        assert asyncio.run(idle()) == (200, b'')
+    finally:
+        server.close()
@@ -0,0 +1,20 @@
+import json
+
+from benchmark import BLANK_SVG, run_effect
+
+SHAPES = (
+    {'header': 'C', 'frets': 'x32010', 'fingers': 'x32010'},
+    {'header': 'G', 'frets': '320003', 'fingers': '21xxx3'},
+)
+
+
+def test_symbols_smaller(tmp_path):
+    """--useSymbols makes a chord sheet smaller, also in a document without xmlns:xlink"""
+    document = BLANK_SVG.replace(b' xmlns:xlink="http://www.w3.org/1999/xlink"', b'')
+    chords_file = tmp_path / 'chords.json'
+    chords_file.write_text(json.dumps(SHAPES), encoding='utf-8')
+    outputs = {use_symbols: run_effect([f'--chordsFile={chords_file}', f'--useSymbols={use_symbols}'],
+                                       document=document)[1]
+               for use_symbols in (False, True)}
+    assert len(outputs[True]) < len(outputs[False])
+    assert outputs[True].count(b'="http://www.w3.org/1999/xlink"') == 1
@@ -0,0 +1,10 @@
+from chord_transpose import transposed_specs
+
+
+def test_capo_variant_headers():
+    """Variant headers name the shape: a G shape with capo 2 is A without a capo, G with the capo on 4 up 2"""
+    g = {'header': 'G', 'frets': '320003', 'fingers': '21xxx3', 'capoPos': '2'}
+    variants = transposed_specs([g], [0, 2], [0, 2, 4])
+    assert {(variant['capoPos'], variant['frets'], variant['header']) for variant in variants} == {
+        ('No', '4-3-1-1-1-4', 'A'), ('No', '4-3-1-1-1-4', 'B'), ('2', '3-2-0-0-0-3', 'G'),
+        ('2', '4-3-1-1-1-4', 'A'), ('4', '3-2-0-0-0-3', 'G')}
@@ -0,0 +1,32 @@
+import pytest
+
+from chord_voicings import Fretboard, find_voicings, fingers_needed, open_string_pitches
+
+
+def test_reentrant_bass():
+    """On the re-entrant ukulele (G-C-E-A) the bass is the lowest note, not the note of the 4th string"""
+    tuning = 'G-C-E-A'
+    voicings = find_voicings('C', tuning).tolist()
+    for frets in voicings:
+        lowest = min(p + f for p, f in zip(open_string_pitches(tuning), frets) if f >= 0)
+        assert lowest % 12 == 0, frets
+
+
+@pytest.mark.parametrize('chord, tuning, first', [
+    ('C', 'G-C-E-A', [0, 0, 0, 3]),
+    ('C', 'E-A-D-G-B-E', [-1, 3, 2, 0, 1, 0]),
+    ('G', 'E-A-D-G-B-E', [3, 2, 0, 0, 0, 3]),
+    ('F', 'E-A-D-G-B-E', [1, 3, 3, 2, 1, 1]),
+])
+def test_ranking(chord, tuning, first):
+    """More sounding strings come first, shapes of the first position before the ones up the neck"""
+    assert find_voicings(chord, tuning)[0].tolist() == first
+
+
+@pytest.mark.parametrize('tuning', ('E-A-D-G-B-E', 'G-C-E-A', 'B-E-A-D-G-B-E'))
+def test_fingers(tuning):
+    """Fingers and barres counted while the shapes are built agree with fingers_needed"""
+    board = Fretboard(tuning, allow_inner_mutes=True)
+    fingers, barre = fingers_needed(board.frets)
+    assert (board.fingers == fingers).all() and (board.barre == barre).all()
+    assert (board.fingers <= 4).all()
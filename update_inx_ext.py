@@ -1,86 +1,194 @@
 import hashlib
+import json
 import os
 import pathlib
 import shutil
 import argparse
 import logging
 import sys
+import tempfile
 
 
 logging.basicConfig(level=logging.DEBUG, format='%(funcName)s %(message)s')
 
-EXTENSION_NAME = 'svgGuitarChord.{}'
-CURENT_PATH = str(pathlib.Path().absolute()) + '/{}'
-EXTENSIONS_PATH = str(pathlib.Path.home()) + '/.config/inkscape/extensions/{}'
-inx_file = EXTENSION_NAME.format('inx')
-py_file = EXTENSION_NAME.format('py')
-
-
-def hash_sum(file_name, block_size=2 ** 12):
-        h = hashlib.md5()
-        with open(file_name, 'rb') as f:
-            while True:
-                hash_block = f.read(block_size)
-                if not hash_block:
-                    break
-                h.update(hash_block)
-        return h.hexdigest()
-
-
-def is_update(file_name):
-    source_file = CURENT_PATH.format(file_name)
-    extension_file = EXTENSIONS_PATH.format(file_name)
-    logging.info(f'Сравниваем хэш суммы для {source_file} и {extension_file}')
-    if hash_sum(source_file) != hash_sum(extension_file):
-        return True if os.stat(source_file).st_mtime > os.stat(extension_file).st_ctime else False
-    return False
+SOURCE_PATH = pathlib.Path(__file__).resolve().parent
+EXTENSION_FILES = (
+    'svgGuitarChord.inx',
+    'svgGuitarChord.py',
+    'chord_render.py',
+    'chord_cache.py',
+    'chord_profile.py',
+    'chord_library.py',
+    'chord_voicings.py',
+    'chordpro.py',
+)
+MANIFEST_NAME = '.svgGuitarChord.manifest.json'
+BACKUP_SUFFIX = '.back'
+
+
+def default_extensions_path():
+    profile = os.environ.get('INKSCAPE_PROFILE_DIR')
+    if profile:
+        return pathlib.Path(profile) / 'extensions'
+    if sys.platform == 'win32':
+        return pathlib.Path(os.environ.get('APPDATA', pathlib.Path.home())) / 'inkscape' / 'extensions'
+    if sys.platform == 'darwin':
+        return pathlib.Path.home() / 'Library/Application Support/org.inkscape.Inkscape/config/inkscape/extensions'
+    return pathlib.Path.home() / '.config' / 'inkscape' / 'extensions'
+
+
+def hash_sum(file_name, block_size=2 ** 16):
+    h = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        while True:
+            hash_block = f.read(block_size)
+            if not hash_block:
+                break
+            h.update(hash_block)
+    return h.hexdigest()
+
+
+def file_state(path, known=None):
+    """{'size', 'mtime_ns', 'hash'} of a file, the hash is taken from known when size and mtime match"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    state = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if known and known.get('size') == state['size'] and known.get('mtime_ns') == state['mtime_ns']:
+        state['hash'] = known['hash']
+    else:
+        state['hash'] = hash_sum(path)
+    return state
+
+
+def atomic_copy(source, destination):
+    # Inkscape never sees a half written extension file
+    fd, tmp_path = tempfile.mkstemp(dir=destination.parent, prefix=destination.name + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        shutil.copyfile(source, tmp_path)
+        shutil.copymode(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_manifest(target):
+    try:
+        with open(target / MANIFEST_NAME, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def save_manifest(target, manifest):
+    tmp_path = target / (MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, target / MANIFEST_NAME)
+
+
+def update_file(file_name, source_path, target, manifest, dry_run=False):
+    """Copies one file when the installed one differs, returns True when it was (or would be) copied"""
+    source = source_path / file_name
+    extension_file = target / file_name
+    entry = manifest.get(file_name, {})
+    source_state = file_state(source, entry.get('source'))
+    if source_state is None:
+        raise FileNotFoundError(f'Нет исходного файла {source}')
+    installed_state = file_state(extension_file, entry.get('installed'))
+    if installed_state is not None and installed_state['hash'] == source_state['hash']:
+        manifest[file_name] = {'source': source_state, 'installed': installed_state}
+        return False
+    if dry_run:
+        logging.info(f'Будет обновлён {extension_file}')
+        return True
+    if installed_state is not None:
+        if entry.get('installed') and entry['installed']['hash'] != installed_state['hash']:
+            logging.warning(f'{extension_file} изменён после прошлого обновления')
+        # Backup only of a file that is about to be replaced
+        atomic_copy(extension_file, extension_file.with_name(extension_file.name + BACKUP_SUFFIX))
+    atomic_copy(source, extension_file)
+    stat = os.stat(extension_file)
+    manifest[file_name] = {'source': source_state,
+                           'installed': {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                         'hash': source_state['hash']}}
+    logging.info(f'Файл расширения {extension_file} обновлён')
+    return True
+
+
+def update_extension(target, file_names, source_path=SOURCE_PATH, dry_run=False):
+    if not dry_run:
+        target.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(target)
+    before = json.dumps(manifest, sort_keys=True)
+    updated = [file_name for file_name in file_names
+               if update_file(file_name, source_path, target, manifest, dry_run)]
+    if not dry_run and json.dumps(manifest, sort_keys=True) != before:
+        save_manifest(target, manifest)
+    if updated:
+        logging.info(f'{target}: обновлено файлов {len(updated)} из {len(file_names)}')
+    else:
+        logging.info(f'{target}: расширение уже обновлено')
+    return updated
 
 
-def update_extension(*file_names):
-    for file_name in file_names:
-        if is_update(file_name):
-            answer = input('Файл в дериктори расширений старый, обновить Y/n?')
-            if answer == 'y' or not answer:
-                shutil.copy(
-                    CURENT_PATH.format(file_name),
-                    EXTENSIONS_PATH.format(file_name),
-                 )
-                logging.info(f'Файлы расширений {file_name} обновлен')
-        else:
-            logging.info(f'Расширение уже обновлено')
-
-def backup_files(*file_names):
+def restore_backup(target, file_names):
+    logging.info(f'Восстановление {target} из бэкапа.')
     for file_name in file_names:
-        shutil.copy(
-            EXTENSIONS_PATH.format(file_name),
-            EXTENSIONS_PATH.format(file_name) + '.back',
-        )
+        backup = target / (file_name + BACKUP_SUFFIX)
+        if backup.exists():
+            atomic_copy(backup, target / file_name)
+            logging.info(f'Файл {file_name} восстановлен.')
 
 
-def restore_backup(*file_names):
-    logging.info(f'Восстановление {file_names[0]}, {file_names[1]} из бэкапа.')
-    for file_name in file_names:
-        shutil.copy(
-            EXTENSIONS_PATH.format(file_name) + '.back',
-            EXTENSIONS_PATH.format(file_name),
-        )
-        logging.info(f'Файл {file_name} восстановлен.')
+def extension_targets(name_space):
+    targets = [pathlib.Path(path) for path in name_space.target]
+    targets += [pathlib.Path(profile) / 'extensions' for profile in name_space.profile]
+    if name_space.targets_file:
+        with open(name_space.targets_file, encoding='utf-8') as f:
+            targets += [pathlib.Path(line.strip()) for line in f if line.strip() and not line.startswith('#')]
+    if not targets:
+        targets = [default_extensions_path()]
+    if name_space.subdir:
+        targets = [target / name_space.subdir for target in targets]
+    return [target.expanduser() for target in targets]
 
 
 def create_parser(args):
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--restore', action='store_true')
+    parser = argparse.ArgumentParser(description='Install or update the extension in Inkscape extension folders.')
+    parser.add_argument('--restore', action='store_true', help='put back the files saved before the last update')
+    parser.add_argument('--target', action='append', default=[], help='extensions folder, can be repeated')
+    parser.add_argument('--profile', action='append', default=[],
+                        help='Inkscape profile folder (INKSCAPE_PROFILE_DIR, portable profiles), can be repeated')
+    parser.add_argument('--targets-file', help='file with one extensions folder per line')
+    parser.add_argument('--subdir', default='', help='install into this subfolder, e.g. GuitarChord')
+    parser.add_argument('--source', default=str(SOURCE_PATH), help='folder with the extension files')
+    parser.add_argument('--files', nargs='+', default=list(EXTENSION_FILES))
+    parser.add_argument('--dry-run', action='store_true', help='only list the files that would be copied')
     return parser.parse_args(args)
 
 
-def main():
-    backup_files(inx_file, py_file)
-    update_extension(inx_file, py_file)
+def main(args):
+    name_space = create_parser(args)
+    status = 0
+    for target in extension_targets(name_space):
+        try:
+            if name_space.restore:
+                restore_backup(target, name_space.files)
+            else:
+                update_extension(target, name_space.files, pathlib.Path(name_space.source), name_space.dry_run)
+        except OSError as error:
+            logging.error(f'{target}: {error}')
+            status = 1
+    return status
 
 
 if __name__ == '__main__':
-    name_space = create_parser(sys.argv[1:])
-    if name_space.restore:
-        restore_backup(inx_file, py_file)
-    else:
-        main()
+    sys.exit(main(sys.argv[1:]))